@@ -0,0 +1,104 @@
+"""
+Archive of the raw html pages returned by Google.
+
+Every page fetched by populate_database is kept in a single SQLite file (archive.sqlite):
+- table blobs: zlib-compressed html, addressed by its SHA-1 (identical pages are stored once),
+- table pages: one row per fetch (query, page number, url, timestamp, SHA-1 of the html).
+
+Rows are only ever appended.
+The archive allows to rebuild the database of GoogleResults (reparse)
+after improving the parser, without querying Google again.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    url TEXT,
+    fetched_at REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_query ON pages (query, page, fetched_at);
+"""
+
+
+class HtmlArchive:
+    """Append-only, content-addressed archive of html pages.
+
+    Pages are indexed by query, page number and fetch time.
+    The archive can be shared by the threads fetching pages.
+    """
+
+    # zlib compression level
+    COMPRESSION = 6
+
+    def __init__(self, archive_path='archive.sqlite'):
+        self.archive_path = archive_path
+        self._conn = sqlite3.connect(archive_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __len__(self):
+        """Number of archived fetches"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def add(self, query, page, url, html, fetched_at=None):
+        """Archive the html of a page, return its digest"""
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        if fetched_at is None:
+            fetched_at = time.time()
+
+        digest = hashlib.sha1(html).hexdigest()
+        data = zlib.compress(html, self.COMPRESSION)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)',
+                (digest, data))
+            self._conn.execute(
+                'INSERT INTO pages (query, page, url, fetched_at, digest) VALUES (?, ?, ?, ?, ?)',
+                (query, page, url, fetched_at, digest))
+        return digest
+
+    def get(self, digest):
+        """Return the html of a digest"""
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        return zlib.decompress(row[0])
+
+    def latest(self, query):
+        """Return the list of (page, html) of the most recent fetch of each page of a query"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT page, digest FROM pages WHERE id IN '
+                '(SELECT MAX(id) FROM pages WHERE query = ? GROUP BY page) ORDER BY page',
+                (query,)).fetchall()
+        return [(page, self.get(digest)) for page, digest in rows]
+
+    def queries(self):
+        """Iterate over the distinct archived queries"""
+        with self._lock:
+            rows = self._conn.execute('SELECT DISTINCT query FROM pages').fetchall()
+        for (query,) in rows:
+            yield query
+
+    def close(self):
+        self._conn.close()
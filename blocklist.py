@@ -0,0 +1,79 @@
+"""
+Blocklist of domains, used to discard GoogleResults from unwanted sites.
+
+Entries are compiled into two sets:
+- hosts (e.g. facebook.com): a host is blocked if it or one of its parent domains is listed,
+- labels (e.g. facebook): a host is blocked if one of its labels is listed.
+Checking a host costs one set lookup per label of the host, whatever the size of the list.
+"""
+
+import hashlib
+import os
+
+
+DEFAULT_BLOCKLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blocklist.txt')
+
+_blocklists = {}
+
+
+class DomainBlocklist:
+    """Set of blocked hosts and domain labels"""
+
+    def __init__(self, entries=()):
+        self.hosts = set()
+        self.labels = set()
+        # Cached digest, reset whenever an entry is added
+        self._digest = None
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_file(cls, path):
+        """Read a blocklist: one entry per line, '#' starts a comment"""
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                entry = line.split('#', 1)[0].strip()
+                if entry:
+                    entries.append(entry)
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.hosts) + len(self.labels)
+
+    def add(self, entry):
+        """Block a host (with its subdomains) or a domain label"""
+        entry = entry.strip().lower().strip('.')
+        self._digest = None
+        if '.' in entry:
+            self.hosts.add(entry)
+        else:
+            self.labels.add(entry)
+
+    def __contains__(self, host):
+        """True if a host is blocked"""
+        if not host:
+            return False
+        parts = host.lower().split('.')
+        for i in range(len(parts)):
+            if '.'.join(parts[i:]) in self.hosts:
+                return True
+        return any(label in self.labels for label in parts)
+
+    @property
+    def digest(self):
+        """Hash of the entries, changes whenever the blocklist changes (computed once)"""
+        if self._digest is None:
+            content = '\n'.join(sorted(self.hosts) + ['#'] + sorted(self.labels))
+            self._digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        return self._digest
+
+
+def load_blocklist(path=DEFAULT_BLOCKLIST_PATH):
+    """Read and compile a blocklist file once, return the cached DomainBlocklist"""
+    try:
+        return _blocklists[path]
+    except KeyError:
+        blocklist = DomainBlocklist.from_file(path)
+        _blocklists[path] = blocklist
+        return blocklist
@@ -0,0 +1,282 @@
+"""
+Export of the database and of the parsed summaries.
+
+Summaries are streamed to results.csv in batches, with a checkpoint allowing to resume
+an interrupted run (CsvSummaryWriter).
+A fingerprint of each exported record is kept next to the export (path + '.fingerprints'),
+so that a later run can reuse the summaries of unchanged records.
+
+Tables can also be written in Parquet (row groups) or Feather (Arrow IPC, memory-mappable) format,
+so that downstream analyses can load only the columns they need.
+Columnar export requires pyarrow (optional dependency).
+"""
+
+import json
+import os
+
+import pandas
+
+from store import items_queried
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+FORMATS = ['parquet', 'feather']
+
+# Schema of the table of raw GoogleResults
+RESULTS_COLUMNS = ['email', 'page', 'index', 'name', 'link', 'domain', 'description']
+
+
+class CsvSummaryWriter:
+    """Append summaries to a CSV file in batches, with a checkpoint after every batch.
+
+    After each batch the CSV file is flushed to disk, then the checkpoint file (path + '.checkpoint')
+    records the last written email, the number of summaries and the size of the CSV file.
+    With resume=True, the CSV file is truncated to the size recorded by the checkpoint
+    (dropping rows written after it) and writing continues after the last checkpointed email.
+    The checkpoint is removed by finish().
+    """
+
+    def __init__(self, path, batch_size=1000, resume=False, tag=None, sep=';'):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+        self.batch_size = batch_size
+        self.sep = sep
+        # Identifies the run (e.g. the parse mode): a checkpoint is only resumed by the same kind of run
+        self.tag = tag
+
+        self.batch = []
+        # Last email written to disk, or None
+        self.last_email = None
+        self.count = 0
+
+        checkpoint = self.read_checkpoint() if resume else None
+        if checkpoint is None:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self.offset = 0
+        else:
+            if checkpoint['tag'] != self.tag:
+                raise ValueError('Checkpoint {0} was written by a different run ({1}), cannot resume'.format(
+                    self.checkpoint_path, checkpoint['tag']))
+            self.last_email = checkpoint['email']
+            self.count = checkpoint['count']
+            self.offset = checkpoint['offset']
+            self._file = open(path, 'r+', newline='', encoding='utf-8')
+            self._file.truncate(self.offset)
+            self._file.seek(self.offset)
+
+    def read_checkpoint(self):
+        """Return the content of the checkpoint file, None if there is none"""
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write(self, summary):
+        """Add a summary, flush to disk when the batch is full"""
+        self.batch.append(summary)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the current batch to disk and checkpoint it"""
+        if not self.batch:
+            return
+        # Rows of a batch interrupted while being written are dropped: the batch is written again
+        # from the last checkpoint
+        self._file.seek(self.offset)
+        self._file.truncate()
+        df_batch = pandas.DataFrame(self.batch)
+        df_batch.to_csv(self._file, sep=self.sep, index=False, header=(self.offset == 0))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self.offset = self._file.tell()
+        self.count += len(self.batch)
+        self.last_email = self.batch[-1]['email']
+        self.batch = []
+        self.write_checkpoint()
+
+    def write_checkpoint(self):
+        """Atomically replace the checkpoint file"""
+        checkpoint = {
+            'tag': self.tag,
+            'email': self.last_email,
+            'count': self.count,
+            'offset': self.offset
+        }
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self):
+        """Flush the pending summaries and close the file, keeping the checkpoint"""
+        self.flush()
+        self._file.close()
+
+    def finish(self):
+        """Flush the pending summaries, close the file and remove the checkpoint"""
+        self.close()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def skip_until(items, email, skipped=None):
+    """Skip the (email, value) items up to the given email (included).
+
+    If given, skipped(email, value) is called for every skipped item.
+    Raise a ValueError if the email is never found.
+    """
+    if email is None:
+        yield from items
+        return
+
+    found = False
+    for e, value in items:
+        if found:
+            yield e, value
+        else:
+            if skipped is not None:
+                skipped(e, value)
+            if e == email:
+                found = True
+    if not found:
+        raise ValueError('Email {0} not found in the database, cannot resume'.format(email))
+
+
+def read_summaries(path, file_format='csv'):
+    """Read a previous export of summaries, return a Dict email -> summary.
+
+    Return an empty Dict if the file does not exist.
+    CSV values are read back as strings, so that they are written again unchanged.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    if file_format == 'csv':
+        df_summaries = pandas.read_csv(path, sep=';', dtype=str, keep_default_na=False)
+    elif file_format == 'parquet':
+        df_summaries = pandas.read_parquet(path)
+    elif file_format == 'feather':
+        df_summaries = pandas.read_feather(path)
+    else:
+        raise ValueError('file_format must be in {0}'.format(['csv'] + FORMATS))
+
+    return {s['email']: s for s in df_summaries.to_dict('records')}
+
+
+def read_fingerprints(path):
+    """Read the fingerprints of the records exported to path, return a Dict email -> fingerprint"""
+    try:
+        with open(path + '.fingerprints') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_fingerprints(path, fingerprints):
+    """Atomically replace the fingerprints of the records exported to path"""
+    fingerprints_path = path + '.fingerprints'
+    tmp_path = fingerprints_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(fingerprints, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, fingerprints_path)
+
+
+def check_pyarrow():
+    """Raise an ImportError if pyarrow is not installed"""
+    if pyarrow is None:
+        raise ImportError('Columnar export requires pyarrow: pip install pyarrow')
+
+
+def results_schema():
+    """Arrow schema of the table of raw GoogleResults"""
+    return pyarrow.schema([
+        ('email', pyarrow.string()),
+        ('page', pyarrow.int32()),
+        ('index', pyarrow.int32()),
+        ('name', pyarrow.string()),
+        ('link', pyarrow.string()),
+        ('domain', pyarrow.string()),
+        ('description', pyarrow.string())
+    ])
+
+
+def iter_result_batches(db, batch_size):
+    """Iterate over Arrow record batches of at most batch_size GoogleResults"""
+    schema = results_schema()
+    columns = {c: [] for c in RESULTS_COLUMNS}
+
+    def make_batch():
+        batch = pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(columns[c], type=schema.field(c).type) for c in RESULTS_COLUMNS],
+            schema=schema)
+        for c in RESULTS_COLUMNS:
+            columns[c].clear()
+        return batch
+
+    for email, results in items_queried(db):
+        for r in results:
+            columns['email'].append(email)
+            columns['page'].append(r.page)
+            columns['index'].append(r.index)
+            columns['name'].append(r.name)
+            columns['link'].append(r.link)
+            columns['domain'].append(r.domain)
+            columns['description'].append(r.description)
+
+        if len(columns['email']) >= batch_size:
+            yield make_batch()
+
+    if columns['email']:
+        yield make_batch()
+
+
+def export_results(db, path, file_format='parquet', batch_size=100000):
+    """Export all stored GoogleResults, one row per result.
+
+    Records are read and written in batches (one Parquet row group per batch):
+    the database is never loaded in memory at once.
+    """
+    check_pyarrow()
+    schema = results_schema()
+
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    elif file_format == 'feather':
+        # Uncompressed Arrow IPC file, which can be memory-mapped when read
+        writer = pyarrow.ipc.new_file(path, schema)
+    else:
+        raise ValueError('file_format must be in {0}'.format(FORMATS))
+
+    n_rows = 0
+    with writer:
+        for batch in iter_result_batches(db, batch_size):
+            writer.write_batch(batch)
+            n_rows += batch.num_rows
+
+    print('Exported {0} results to {1}.'.format(n_rows, path))
+
+
+def export_summaries(summaries, path, file_format='parquet'):
+    """Export the list of summaries produced by parse.parseResults"""
+    check_pyarrow()
+    df_summaries = pandas.DataFrame(summaries)
+
+    if file_format == 'parquet':
+        df_summaries.to_parquet(path, index=False)
+    elif file_format == 'feather':
+        df_summaries.to_feather(path, compression='uncompressed')
+    else:
+        raise ValueError('file_format must be in {0}'.format(FORMATS))
@@ -1,3 +1,3 @@
 from __future__ import absolute_import
-from .modules import calculator, currency, images, utils
+from .modules import calculator, currency, images, parsers, utils
 from .modules import standard_search, shopping_search
@@ -1,4 +1,5 @@
 from __future__ import print_function
+from . import parsers
 from . import calculator
 from . import currency
 from . import images
@@ -5,7 +5,7 @@ from unidecode import unidecode
 
 from .utils import get_html_from_dynamic_site
 from .utils import _get_search_url
-from bs4 import BeautifulSoup
+from .parsers import make_soup
 
 
 class CalculatorResult(object):
@@ -46,7 +46,7 @@ def calculate(expr):
 
     url = _get_search_url(expr)
     html = get_html_from_dynamic_site(url)
-    bs = BeautifulSoup(html)
+    bs = make_soup(html)
 
     cr = CalculatorResult()
     cr.value = _get_to_value(bs)
@@ -2,7 +2,7 @@ from __future__ import unicode_literals
 from __future__ import absolute_import
 
 from .utils import get_html
-from bs4 import BeautifulSoup
+from .parsers import make_soup
 
 
 # PUBLIC
@@ -48,7 +48,7 @@ def _get_currency_req_url(amount, from_currency, to_currency):
 
 
 def _parse_currency_response(response, to_currency):
-    bs = BeautifulSoup(response)
+    bs = make_soup(response)
     str_rate = bs.find(id="currency_converter_result").span.get_text()
     rate = float(str_rate.replace(to_currency, "").strip())
     return rate
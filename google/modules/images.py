@@ -9,7 +9,7 @@ from builtins import object
 from unidecode import unidecode
 
 from .utils import get_browser_with_url, write_html_to_file, measure_time
-from bs4 import BeautifulSoup
+from .parsers import make_soup
 import urllib.parse
 import sys
 import requests
@@ -378,7 +378,7 @@ def search_old(query, image_options=None, pages=1):
                 write_html_to_file(
                     html, "images_{0}_{1}.html".format(query.replace(" ", "_"), i))
             j = 0
-            soup = BeautifulSoup(html)
+            soup = make_soup(html)
             match = re.search("dyn.setResults\((.+)\);</script>", html)
             if match:
                 init = str(match.group(1), errors="ignore")
@@ -444,7 +444,7 @@ def search(query, image_options=None, num_images=50):
         html = browser.page_source
 
         if html:
-            soup = BeautifulSoup(html)
+            soup = make_soup(html)
 
             # iterate over the divs containing images in one page
             divs = _find_divs_with_images(soup)
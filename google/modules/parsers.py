@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+from bs4 import BeautifulSoup, UnicodeDammit
+from bs4.builder import builder_registry
+
+
+# Tree builders, fastest first. lxml is a C library and must be installed
+# separately; html.parser is always available.
+PARSER_PREFERENCE = ["lxml", "html.parser"]
+
+_parser = None
+
+
+# PUBLIC
+def available_parsers():
+    """Returns the names of the installed tree builders, fastest first."""
+    return [p for p in PARSER_PREFERENCE if builder_registry.lookup(p)]
+
+
+def get_parser():
+    """Returns the name of the tree builder used to parse pages.
+
+    Defaults to the fastest installed one."""
+    global _parser
+    if _parser is None:
+        _parser = available_parsers()[0]
+    return _parser
+
+
+def set_parser(name):
+    """Use a given tree builder to parse pages (eg. "html.parser")."""
+    global _parser
+    if builder_registry.lookup(name) is None:
+        raise ValueError("HTML parser {} is not installed".format(name))
+    _parser = name
+
+
+def make_soup(html, parser=None, parse_only=None):
+    """Returns the parsed tree of a page.
+
+    Whatever the tree builder, the tree has the BeautifulSoup interface
+    (find, find_all, get, text): extraction functions do not depend on it.
+
+    Args:
+        html: Html of the page (bytes or text).
+        parser: Name of the tree builder, default given by get_parser().
+        parse_only: Optional SoupStrainer: only the matching tags (and their
+            content) are built into the tree.
+    """
+    if parser is None:
+        parser = get_parser()
+    return BeautifulSoup(html, parser, parse_only=parse_only)
+
+
+def to_text(html):
+    """Returns the html of a page as text, decoded with its declared encoding."""
+    if isinstance(html, bytes):
+        return UnicodeDammit(html, is_html=True).unicode_markup
+    return html
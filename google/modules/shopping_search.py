@@ -6,7 +6,7 @@ from builtins import range
 from builtins import object
 
 from .utils import get_html, normalize_query
-from bs4 import BeautifulSoup
+from .parsers import make_soup
 import re
 from unidecode import unidecode
 
@@ -36,7 +36,7 @@ def shopping(query, pages=1):
         html = get_html(url)
         if html:
             j = 0
-            soup = BeautifulSoup(html)
+            soup = make_soup(html)
 
             products = soup.findAll("div", "g")
             print("yoooo", products)
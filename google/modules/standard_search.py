@@ -6,16 +6,49 @@ standard_library.install_aliases()
 from builtins import range
 from builtins import object
 from .utils import _get_search_url, get_html
-from bs4 import BeautifulSoup
+from .parsers import make_soup, to_text
+from bs4 import SoupStrainer
 import urllib.parse
 from urllib.parse import unquote
 from unidecode import unidecode
-from re import match
+import re
+import sys
+
+
+# External link wrapped in a google redirection link
+_LINK_RE = re.compile(r'/url\?(url|q)=(.+?)&')
+
+# Opening or closing div tag, and class attribute of a tag
+_DIV_TAG_RE = re.compile(r'<(/?)div\b([^>]*)>', re.IGNORECASE)
+_CLASS_RE = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+
+def _is_result_class(value):
+    """True if a class attribute contains the class of search results ("g")."""
+    if not value:
+        return False
+    if not isinstance(value, list):
+        value = value.split()
+    return "g" in value
+
+
+# Build only the result containers, skipping scripts, headers and footers
+_RESULTS_STRAINER = SoupStrainer("div", attrs={"class": _is_result_class})
 
 
 class GoogleResult(object):
 
-    """Represents a google search result."""
+    """Represents a google search result.
+
+    Attributes are stored in slots (no per-instance __dict__), and results are
+    pickled as a plain tuple of their fields."""
+
+    # Fields, in the order they are pickled
+    FIELDS = ("name", "link", "google_link", "description", "thumb", "cached",
+              "page", "index")
+
+    __slots__ = ("name", "_link", "google_link", "description", "thumb",
+                 "cached", "page", "index", "_domain")
 
     def __init__(self):
         self.name = None  # The title of the link
@@ -27,6 +60,39 @@ class GoogleResult(object):
         self.page = None  # Results page this one was on
         self.index = None  # What index on this page it was on
 
+    @property
+    def link(self):
+        return self._link
+
+    @link.setter
+    def link(self, link):
+        self._link = link
+        self._domain = None
+
+    @property
+    def domain(self):
+        """Host of the external link (lowercase), or None.
+
+        Domains are interned: all the results of a site share the same string."""
+        if self._domain is None and self._link:
+            try:
+                host = urllib.parse.urlsplit(self._link).hostname
+            except ValueError:
+                host = None
+            if host:
+                self._domain = sys.intern(host)
+        return self._domain
+
+    def __getstate__(self):
+        return tuple(getattr(self, f) for f in self.FIELDS)
+
+    def __setstate__(self, state):
+        # Results pickled before slots were introduced have a dict state
+        if isinstance(state, dict):
+            state = tuple(state.get(f) for f in self.FIELDS)
+        for f, value in zip(self.FIELDS, state):
+            setattr(self, f, value)
+
     def __repr__(self):
         name = self._limit_str_size(self.name, 55)
         description = self._limit_str_size(self.description, 49)
@@ -50,101 +116,196 @@ class GoogleResult(object):
 
 
 # PUBLIC
-def search(query, pages=1, lang='en', void=True):
+def search(query, pages=1, lang='en', void=True, archive=None, stop=None):
     """Returns a list of GoogleResult.
 
     Args:
         query: String to search in google.
         pages: Number of pages where results must be taken.
+        archive: Optional object with a method add(query, page, url, html),
+            called with the raw html of every fetched page.
+        stop: Optional function called with the results found so far after
+            each page: if it returns True, the next pages are not fetched.
 
     Returns:
         A GoogleResult object."""
 
     results = []
+    for i, page_results in search_pages(query, pages, lang=lang, void=void, archive=archive):
+        results.extend(page_results)
+        if stop is not None and stop(results):
+            break
+
+    return results
+
+
+def search_pages(query, pages=1, lang='en', void=True, archive=None):
+    """Yields (page number, list of GoogleResult) for each page, in order.
+
+    Each page is fetched (exactly one request) only when the caller asks for
+    it: stopping the iteration early saves the requests of the next pages.
+    A page without results (end of the results) or which could not be
+    fetched yields an empty list, and is the last one: the next pages are
+    not requested.
+
+    Args:
+        See search."""
+
     for i in range(pages):
         url = _get_search_url(query, i, lang=lang)
         html = get_html(url)
 
+        results = []
         if html:
-            soup = BeautifulSoup(html, "html.parser")
-            divs = soup.findAll("div", attrs={"class": "g"})
-
-            j = 0
-            for li in divs:
-                res = GoogleResult()
-
-                res.page = i
-                res.index = j
-
-                res.name = _get_name(li)
-                res.link = _get_link(li)
-                res.google_link = _get_google_link(li)
-                res.description = _get_description(li)
-                res.thumb = _get_thumb()
-                res.cached = _get_cached(li)
-                if void is True:
-                    if res.description is None:
-                        continue
-                results.append(res)
-                j += 1
+            if archive is not None:
+                archive.add(query, i, url, html)
+            results = parse_page(html, i, void=void)
+        yield i, results
+
+        if not results:
+            return
+
+
+def parse_page(html, page=0, void=True, mode="partial"):
+    """Returns the list of GoogleResult contained in the html of a results page.
+
+    Args:
+        html: Html of a google results page.
+        page: Number of the page.
+        void: Skip results without description.
+        mode: "full" builds the tree of the whole page, "partial" only the
+            tree of the result containers, "stream" cuts the result containers
+            out of the html and builds their trees one at a time.
+
+    Returns:
+        A list of GoogleResult objects."""
+
+    if mode == "full":
+        divs = _find_results(make_soup(html))
+    elif mode == "partial":
+        divs = _find_results(make_soup(html, parse_only=_RESULTS_STRAINER))
+    elif mode == "stream":
+        divs = (div for block in iter_result_blocks(html)
+                for div in _find_results(make_soup(block)))
+    else:
+        raise ValueError("mode must be full, partial or stream")
+
+    results = []
+    j = 0
+    for li in divs:
+        res = _extract_result(li)
+
+        res.page = page
+        res.index = j
+
+        if void is True:
+            if res.description is None:
+                continue
+        results.append(res)
+        j += 1
 
     return results
 
 
-# PRIVATE
-def _get_name(li):
-    """Return the name of a google search."""
-    a = li.find("a")
-    # return a.text.encode("utf-8").strip()
-    if a is not None:
-        return a.text.strip()
-    return None
+def iter_result_blocks(html):
+    """Yields the html of each top-level result container of a page.
 
+    The html is scanned for div tags, without building any tree."""
 
-def _get_link(li):
-    """Return external link from a search."""
-    try:
-        a = li.find("a")
-        link = a["href"]
-    except:
+    html = to_text(html)
+
+    start = None
+    depth = 0
+    for m in _DIV_TAG_RE.finditer(html):
+        closing, attributes = m.group(1), m.group(2)
+
+        if start is None:
+            if not closing:
+                cls = _CLASS_RE.search(attributes)
+                if cls and _is_result_class(next(g for g in cls.groups() if g is not None)):
+                    start = m.start()
+                    depth = 1
+        elif closing:
+            depth -= 1
+            if depth == 0:
+                yield html[start:m.end()]
+                start = None
+        elif not attributes.rstrip().endswith("/"):
+            depth += 1
+
+
+# PRIVATE
+def _find_results(soup):
+    """Return the result containers of a parsed page."""
+    return soup.find_all("div", attrs={"class": "g"})
+
+
+def _extract_result(li):
+    """Return a GoogleResult with all the fields of a search result node.
+
+    The node is walked once: the fields only depend on the first two links
+    and on the description block."""
+
+    anchors = []
+    sdiv = None
+    for node in li.descendants:
+        node_name = getattr(node, "name", None)
+        if node_name == "a":
+            if len(anchors) < 2:
+                anchors.append(node)
+        elif node_name == "div" and sdiv is None and "s" in node.get("class", ()):
+            sdiv = node
+
+    res = GoogleResult()
+    if anchors:
+        a = anchors[0]
+        href = a.get("href")
+        res.name = a.text.strip()
+        res.link = _get_link(href)
+        res.google_link = _get_google_link(href)
+    res.description = _get_description(sdiv)
+    res.thumb = _get_thumb()
+    if len(anchors) > 1:
+        res.cached = _get_cached(anchors[1])
+    return res
+
+
+def _get_link(href):
+    """Return external link from the href of a search."""
+    if href is None:
         return None
 
-    if link.startswith("/url?"):
-        m = match('/url\?(url|q)=(.+?)&', link)
-        if m and len(m.groups()) == 2:
+    if href.startswith("/url?"):
+        m = _LINK_RE.match(href)
+        if m:
             return unquote(m.group(2))
 
     return None
 
 
-def _get_google_link(li):
-    """Return google link from a search."""
-    try:
-        a = li.find("a")
-        link = a["href"]
-    except:
+def _get_google_link(href):
+    """Return google link from the href of a search."""
+    if href is None:
         return None
 
-    if link.startswith("/url?") or link.startswith("/search?"):
-        return urllib.parse.urljoin("http://www.google.com", link)
+    if href.startswith("/url?") or href.startswith("/search?"):
+        return urllib.parse.urljoin("http://www.google.com", href)
 
     else:
         return None
 
 
-def _get_description(li):
-    """Return the description of a google search.
+def _get_description(sdiv):
+    """Return the description of a google search, from its "s" div.
 
     TODO: There are some text encoding problems to resolve."""
 
-    sdiv = li.find("div", attrs={"class": "s"})
-    if sdiv:
+    if sdiv is not None:
         stspan = sdiv.find("span", attrs={"class": "st"})
         if stspan is not None:
             # return stspan.text.encode("utf-8").strip()
             return stspan.text.strip()
-    else:
-        return None
+    return None
 
 
 def _get_thumb():
@@ -152,11 +313,10 @@ def _get_thumb():
     pass
 
 
-def _get_cached(li):
-    """Return a link to the cached version of the page."""
-    links = li.find_all("a")
-    if len(links) > 1 and links[1].text == "Cached":
-        link = links[1]["href"]
+def _get_cached(a):
+    """Return a link to the cached version of the page, from the second link of a search."""
+    if a.text == "Cached":
+        link = a["href"]
         if link.startswith("/url?") or link.startswith("/search?"):
             return urllib.parse.urljoin("http://www.google.com", link)
     return None
@@ -7,13 +7,24 @@ standard_library.install_aliases()
 from builtins import range
 from past.utils import old_div
 import time
+import threading
 from selenium import webdriver
 import urllib.request, urllib.error, urllib.parse
 from functools import wraps
-# import requests
+import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
 
 
+USER_AGENT = "Mozilla/5.001 (windows; U; NT4.0; en-US; rv:1.0) Gecko/25250101"
+
+# Default (connect, read) timeouts of get_html, in seconds
+TIMEOUT = (10, 30)
+
+_session = None
+_session_lock = threading.Lock()
+
+
 def measure_time(fn):
 
     def decorator(*args, **kwargs):
@@ -46,25 +57,77 @@ def _get_search_url(query, page=0, per_page=10, lang='en'):
     return url
 
 
-def get_html(url):
-    header = "Mozilla/5.001 (windows; U; NT4.0; en-US; rv:1.0) Gecko/25250101"
-    try:
-        request = urllib.request.Request(url)
-        request.add_header("User-Agent", header)
-        html = urllib.request.urlopen(request).read()
-        return html
-    except urllib.error.HTTPError as e:
-        print("Error accessing:", url)
-        if e.code == 503:
-            print("Google is requiring a Captcha. " \
-                  "For more information see: 'https://support.google.com/websearch/answer/86640'")
-        raise e
+def make_session(pool_size=10):
+    """Returns a new HTTP session.
+
+    The session keeps up to pool_size keep-alive connections per host,
+    and asks for gzip/deflate compressed pages (decoded transparently)."""
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": "gzip, deflate"
+    })
+    return session
+
+
+def get_session():
+    """Returns the HTTP session shared by all the modules (created on first use)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
 
+def configure_session(pool_size=10, timeout=None):
+    """Replace the shared HTTP session.
+
+    Args:
+        pool_size: Number of keep-alive connections kept per host (at least
+            the number of threads using the session).
+        timeout: (connect, read) timeouts in seconds of get_html.
+    """
+    global _session, TIMEOUT
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = make_session(pool_size)
+        if timeout is not None:
+            TIMEOUT = timeout
+
+
+def get_html(url, session=None, timeout=None):
+    """Returns the content of url, using the shared HTTP session by default.
+
+    Raises urllib.error.HTTPError on HTTP errors; returns None if the page
+    could not be fetched for any other reason."""
+
+    if session is None:
+        session = get_session()
+    if timeout is None:
+        timeout = TIMEOUT
+
+    try:
+        response = session.get(url, timeout=timeout)
     except Exception as e:
         print("Error accessing:", url)
         print(e)
         return None
 
+    if response.status_code >= 400:
+        print("Error accessing:", url)
+        if response.status_code == 503:
+            print("Google is requiring a Captcha. " \
+                  "For more information see: 'https://support.google.com/websearch/answer/86640'")
+        raise urllib.error.HTTPError(url, response.status_code, response.reason,
+                                     response.headers, None)
+
+    return response.content
+
 
 def write_html_to_file(html, filename):
     of = open(filename, "w")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the speed of the installed html parsers on the test pages.
+
+Run from the repository root:
+
+    python -m google.tests.benchmark_parsers
+"""
+
+from __future__ import print_function
+import os
+import timeit
+
+from google.modules import parsers, standard_search
+
+HTML_DIR = os.path.join(os.path.dirname(__file__), "html_files")
+PAGES = ["test_standard_search.html", "test_shopping_search.html",
+         "test_calculator.html", "test_search_images.html"]
+
+
+def parse_results(html, parser):
+    """Parse a page and extract its search results (li or div of class g)."""
+    soup = parsers.make_soup(html, parser)
+    nodes = soup.find_all(["li", "div"], attrs={"class": "g"})
+    return [standard_search._extract_result(node) for node in nodes]
+
+
+def benchmark(loops=20):
+    for page in PAGES:
+        with open(os.path.join(HTML_DIR, page), "rb") as f:
+            html = f.read()
+
+        print("{} ({} kB)".format(page, len(html) // 1024))
+        reference = None
+        for parser in parsers.available_parsers():
+            elapsed = timeit.timeit(lambda: parse_results(html, parser), number=loops)
+
+            # every parser must extract the same results
+            fields = [(r.name, r.link, r.description) for r in parse_results(html, parser)]
+            if reference is None:
+                reference = fields
+            same = "same results" if fields == reference else "DIFFERENT results"
+
+            print("  {:12} {:8.2f} ms/page  {}".format(
+                parser, 1000 * elapsed / loops, same))
+
+
+if __name__ == "__main__":
+    benchmark()
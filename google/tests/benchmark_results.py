@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the memory used by GoogleResult with a plain object with a __dict__.
+
+Run from the repository root:
+
+    python -m google.tests.benchmark_results
+"""
+
+from __future__ import print_function
+import pickle
+import tracemalloc
+
+from google.modules.standard_search import GoogleResult
+
+N_RESULTS = 100000
+
+
+class DictGoogleResult(object):
+
+    """GoogleResult as it was before slots: attributes in a __dict__."""
+
+    def __init__(self):
+        self.name = None
+        self.link = None
+        self.google_link = None
+        self.description = None
+        self.thumb = None
+        self.cached = None
+        self.page = None
+        self.index = None
+
+
+def make_fields(n):
+    """Field values of n results."""
+    fields = []
+    for i in range(n):
+        link = "https://www.site{}.com/people/{}".format(i % 50, i)
+        fields.append(("Result {} - Some Site".format(i), link,
+                       "http://www.google.com/url?q=" + link,
+                       "Description of result {}".format(i), 0, i % 10))
+    return fields
+
+
+def make_results(cls, fields):
+    results = []
+    for name, link, google_link, description, page, index in fields:
+        res = cls()
+        res.name = name
+        res.link = link
+        res.google_link = google_link
+        res.description = description
+        res.page = page
+        res.index = index
+        results.append(res)
+    return results
+
+
+def measure(cls, fields):
+    """Return (bytes allocated by the objects, bytes pickled) for a list of results.
+
+    Field values are allocated beforehand: only the cost of the objects is measured."""
+    tracemalloc.start()
+    results = make_results(cls, fields)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    pickled = len(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+    return allocated, pickled
+
+
+def benchmark(n=N_RESULTS):
+    print("{} results".format(n))
+    fields = make_fields(n)
+    for cls in [DictGoogleResult, GoogleResult]:
+        allocated, pickled = measure(cls, fields)
+        print("  {:18} memory {:8.1f} MB   pickle {:8.1f} MB".format(
+            cls.__name__, allocated / 2.0 ** 20, pickled / 2.0 ** 20))
+
+
+if __name__ == "__main__":
+    benchmark()
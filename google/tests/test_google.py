@@ -2,9 +2,11 @@ from builtins import object
 import unittest
 import nose
 from google import google
-from google import currency, images
-from mock import Mock
+from google import currency, images, parsers, standard_search
+from mock import Mock, patch
+from bs4 import BeautifulSoup
 import os
+import pickle
 import vcr
 
 BASE_DIR = os.path.dirname(__file__)
@@ -170,6 +172,146 @@ class SearchImagesTest(unittest.TestCase):
         pass
 
 
+class StandardSearchTest(unittest.TestCase):
+
+    @load_html_file("html_files")
+    def test_standard_search(self, html_f):
+        """Test the extraction of all the fields of a search result."""
+
+        soup = BeautifulSoup(html_f.read(), "html.parser")
+        nodes = soup.find_all("li", attrs={"class": "g"})
+        res = [standard_search._extract_result(li) for li in nodes]
+        self.assertEqual(len(res), 7)
+
+        self.assertEqual(res[0].name, "GitHub \xb7 Build software better, together.")
+        self.assertEqual(res[0].link, "https://github.com/")
+        self.assertTrue(res[0].google_link.startswith(
+            "http://www.google.com/url?q=https://github.com/&sa=U"))
+        self.assertTrue(res[0].cached.startswith(
+            "http://www.google.com/url?q=http://webcache.googleusercontent.com/"))
+        self.assertTrue(res[0].description.startswith("Sign up for GitHub."))
+
+        # news block: google link only
+        self.assertEqual(res[2].name, "News for github")
+        self.assertIsNone(res[2].link)
+        self.assertTrue(res[2].google_link.startswith(
+            "http://www.google.com/search?q=github&hl=en"))
+        self.assertIsNone(res[2].cached)
+        self.assertIsNone(res[2].description)
+
+        self.assertEqual(res[5].link,
+            "https://play.google.com/store/apps/details?id=com.github.mobile&hl=en")
+
+    def test_parse_page_modes(self):
+        """Test that partial and streamed parsing find the same results."""
+
+        result = ('<div class="{cls}"><h3 class="r"><a href="/url?q=http://{n}.com/&amp;sa=U">'
+                  'Result {n}</a></h3><div class="s"><div><span class="st">About {n}</span>'
+                  '</div></div></div>')
+        html = ("<html><head><script>var s = '<div class=\"x\">';</script></head><body>"
+                "<div id='header'><div class='gb'>menu</div></div><div id='ires'>" +
+                result.format(cls="g", n=1) +
+                result.format(cls="rc g", n=2) +
+                "<div class='g'><br/><div class='g'>nested</div></div>" +
+                result.format(cls="g", n=3) +
+                "</div><div id='footer'>footer</div></body></html>").encode("utf-8")
+
+        full = standard_search.parse_page(html, mode="full", void=False)
+        self.assertEqual(len(full), 5)
+        self.assertEqual([r.link for r in full if r.link],
+                         ["http://1.com/", "http://2.com/", "http://3.com/"])
+
+        for mode in ["partial", "stream"]:
+            res = standard_search.parse_page(html, mode=mode, void=False)
+            self.assertEqual([(r.index, r.name, r.link, r.description) for r in res],
+                             [(r.index, r.name, r.link, r.description) for r in full])
+
+        blocks = list(standard_search.iter_result_blocks(html))
+        self.assertEqual(len(blocks), 4)
+        self.assertTrue(blocks[2].endswith("nested</div></div>"))
+
+    def test_search_pages_stop(self):
+        """Test that pages are fetched one at a time, until the stop condition."""
+
+        result = ('<html><body><div id="ires"><div class="g"><h3 class="r">'
+                  '<a href="/url?q=http://{0}.com/&amp;sa=U">Result {0}</a></h3>'
+                  '</div></div></body></html>')
+        html = Mock(side_effect=[result.format(n).encode("utf-8") for n in range(3)])
+
+        with patch.object(standard_search, "get_html", html):
+            pages = standard_search.search_pages("github", pages=3, void=False)
+            self.assertEqual(html.call_count, 0)
+            i, res = next(pages)
+            self.assertEqual(i, 0)
+            self.assertEqual([r.link for r in res], ["http://0.com/"])
+            self.assertEqual(html.call_count, 1)
+
+        html = Mock(side_effect=[result.format(n).encode("utf-8") for n in range(3)])
+        with patch.object(standard_search, "get_html", html):
+            res = standard_search.search("github", pages=3, void=False,
+                                         stop=lambda results: len(results) >= 2)
+        self.assertEqual([r.link for r in res], ["http://0.com/", "http://1.com/"])
+        self.assertEqual(html.call_count, 2)
+
+    def test_search_pages_end(self):
+        """Test that no page is requested after a page without results."""
+
+        result = ('<html><body><div id="ires"><div class="g"><h3 class="r">'
+                  '<a href="/url?q=http://{0}.com/&amp;sa=U">Result {0}</a></h3>'
+                  '</div></div></body></html>')
+        empty = '<html><body><div id="ires"></div></body></html>'
+
+        for pages in [[result.format(0), empty, result.format(2)],
+                      [result.format(0), None, result.format(2)]]:
+            html = Mock(side_effect=[p.encode("utf-8") if p else p for p in pages])
+            with patch.object(standard_search, "get_html", html):
+                res = list(standard_search.search_pages("github", pages=5, void=False))
+            self.assertEqual([(i, len(r)) for i, r in res], [(0, 1), (1, 0)])
+            self.assertEqual(html.call_count, 2)
+
+    def test_google_result(self):
+        """Test the compact GoogleResult: slots, domain and pickling."""
+
+        res = standard_search.GoogleResult()
+        self.assertFalse(hasattr(res, "__dict__"))
+        self.assertIsNone(res.domain)
+
+        res.name = "GitHub"
+        res.link = "https://GitHub.com/about"
+        res.page = 0
+        res.index = 3
+        self.assertEqual(res.domain, "github.com")
+        res.link = "https://www.wikipedia.org/"
+        self.assertEqual(res.domain, "www.wikipedia.org")
+
+        copy = pickle.loads(pickle.dumps(res))
+        self.assertEqual(repr(copy), repr(res))
+        self.assertEqual((copy.link, copy.page, copy.index),
+                         ("https://www.wikipedia.org/", 0, 3))
+
+        # results pickled before slots have a dict state
+        old = standard_search.GoogleResult.__new__(standard_search.GoogleResult)
+        old.__setstate__({"name": "x", "link": "http://a.org/", "page": 1})
+        self.assertEqual((old.name, old.link, old.page, old.description),
+                         ("x", "http://a.org/", 1, None))
+
+
+class ParsersTest(unittest.TestCase):
+
+    def test_available_parsers(self):
+        available = parsers.available_parsers()
+        self.assertIn("html.parser", available)
+        self.assertIn(parsers.get_parser(), available)
+
+    def test_set_parser(self):
+        self.assertRaises(ValueError, parsers.set_parser, "no-such-parser")
+
+    def test_make_soup(self):
+        for parser in parsers.available_parsers():
+            soup = parsers.make_soup("<div class='g'><a href='/url?q=x&'>x</a></div>", parser)
+            self.assertEqual(len(soup.find_all("div", attrs={"class": "g"})), 1)
+
+
 if __name__ == '__main__':
     # nose.main()
     nose.run(defaultTest=__name__)
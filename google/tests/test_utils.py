@@ -6,9 +6,11 @@
 from __future__ import print_function
 from __future__ import with_statement
 import unittest
+import urllib.error
 import nose
+from mock import Mock
 
-from google.modules.utils import _get_search_url
+from google.modules.utils import _get_search_url, get_html, get_session
 
 
 class UtilsTestCase(unittest.TestCase):
@@ -20,5 +22,29 @@ class UtilsTestCase(unittest.TestCase):
         self.assertEqual(url, exp_url)
 
 
+class GetHtmlTestCase(unittest.TestCase):
+    """Tests for the pooled HTTP transport."""
+
+    def test_shared_session(self):
+        session = get_session()
+        self.assertIs(session, get_session())
+        self.assertIn("gzip", session.headers["Accept-Encoding"])
+
+    def test_get_html(self):
+        session = Mock()
+        session.get.return_value = Mock(status_code=200, content=b"<html></html>")
+        html = get_html("http://www.google.com", session=session, timeout=(1, 2))
+        self.assertEqual(html, b"<html></html>")
+        session.get.assert_called_once_with("http://www.google.com", timeout=(1, 2))
+
+    def test_get_html_http_error(self):
+        session = Mock()
+        session.get.return_value = Mock(status_code=503, reason="Service Unavailable",
+                                        headers={}, content=b"")
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            get_html("http://www.google.com", session=session)
+        self.assertEqual(cm.exception.code, 503)
+
+
 if __name__ == '__main__':
     nose.run(defaultTest=__name__)
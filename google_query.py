@@ -1,8 +1,44 @@
 import google
 
 
-def do_google_query(query):
-    """Perform a Google search using a query string. Return GoogleResults in the first page."""
-    num_page = 1
-    search_results = google.standard_search.search(query, num_page)
+def do_google_query(query, archive=None, pages=1, stop=None, limiter=None):
+    """Perform a Google search using a query string. Return GoogleResults in the first pages.
+
+    If given, archive stores the raw html of the fetched pages (see archive.py).
+    Up to `pages` pages are fetched, one at a time: if given, stop(results so far) is called after each page,
+    and the next pages are not fetched once it returns True (nor after a page without results).
+    If given, limiter.acquire() is called before every page request."""
+    search_results, _ = do_google_query_pages(query, archive=archive, pages=pages, stop=stop, limiter=limiter)
+    return(search_results)
+
+
+def do_google_query_pages(query, archive=None, pages=1, stop=None, limiter=None):
+    """Same as do_google_query, return (GoogleResults, number of pages actually fetched)."""
+    search_results = []
+    n_pages = 0
+    result_pages = google.standard_search.search_pages(query, pages, archive=archive)
+    for _ in range(pages):
+        if limiter is not None:
+            limiter.acquire()
+        page, page_results = next(result_pages)
+        n_pages += 1
+        search_results.extend(page_results)
+        # No more results: the next pages would be empty too
+        if not page_results:
+            break
+        if stop is not None and stop(search_results):
+            break
+    return(search_results, n_pages)
+
+
+def configure_http(pool_size):
+    """Keep enough pooled HTTP connections for pool_size concurrent queries."""
+    google.utils.configure_session(pool_size=pool_size)
+
+
+def parse_google_pages(pages):
+    """Rebuild GoogleResults from a list of (page, html), e.g. from the archive."""
+    search_results = []
+    for page, html in pages:
+        search_results.extend(google.standard_search.parse_page(html, page))
     return(search_results)
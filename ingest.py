@@ -9,6 +9,8 @@ Google results are further refined in parse.py.
 # 
 Data format:
 - a database is a Dict with email as the key, list of GoogleResult as value.
+  It is stored on disk as a SQLite file (database.sqlite, see store.py),
+  or pickled if the path ends with .pickle.
 - addresses.csv:
 Country;CompanyName;FirstName;LastName;Title;EmailAddress
 Germany;Company1;first_name_1;last_name_1;Dr.;foo1@bar.com
@@ -18,11 +20,15 @@ France;Company2;first_name_4;last_name_4;Dr.;foo4@bar.com
 """
 
 import pandas as pd
+import os
 import pickle
+import re
 import sys
 import subprocess
 
 from google_query import *
+from store import ResultStore, is_pickle_path, migrate_pickle, count_queried, emails_not_queried
+from pipeline import RateLimiter, fetch_all
 import urllib
 import urllib.error
 
@@ -46,127 +52,390 @@ def refresh_VPN():
     # print('done.')
 
 
-def write_database(db, db_path='database.pickle'):
-    """Write the Google result database to disk"""
-    with open(db_path, 'wb') as f:
-        pickle.dump(db, f)
+DEFAULT_DB_PATH = 'database.sqlite'
+
+
+def write_database(db, db_path=DEFAULT_DB_PATH):
+    """Write the Google result database to disk
+
+    A ResultStore already commits every assignment: writing it back to its own file is a no-op.
+    A Dict replaces the content of the SQLite store, or is pickled if db_path ends with .pickle.
+    """
+    if isinstance(db, ResultStore) and os.path.abspath(db.db_path) == os.path.abspath(db_path):
+        db.commit()
+        return
+
+    if is_pickle_path(db_path):
+        with open(db_path, 'wb') as f:
+            pickle.dump(dict(db), f)
+    else:
+        store = ResultStore(db_path)
+        store.replace_all(db)
+        store.close()
     print("Wrote to disk.")
 
 
 def make_new_database(addresses_path='addresses.csv'):
     """Make empty database from emails in .csv form
 
-    A database is a dictionary with email as the key, list of GoogleResult as value
+    A database is a dictionary with email as the key, list of GoogleResult as value.
+    Emails are normalized (stripped, lowercased): duplicates and invalid addresses are skipped.
     """
 
     df = read_addresses(addresses_path)
-    db = dict.fromkeys(df['EmailAddress'].values)
+    emails = [normalize_email(e) for e in df['EmailAddress'].values]
+    db = dict.fromkeys(e for e in emails if e is not None)
 
-    print("Made new database.")
+    n_invalid = sum(1 for e in emails if e is None)
+    print("Made new database: {0} emails ({1} duplicates, {2} invalid skipped).".format(
+        len(db), len(emails) - n_invalid - len(db), n_invalid))
     return db
 
 
-def load_database(db_path='database.pickle'):
-    """Load the saved database of queried results"""
-    with open(db_path, 'rb') as f:
-        db = pickle.load(f)
+def load_database(db_path=DEFAULT_DB_PATH, readonly=False):
+    """Load the saved database of queried results
+
+    Return a ResultStore, or a Dict if db_path ends with .pickle.
+    A ResultStore only reads records when they are accessed;
+    open it with readonly=True when the database is not modified (stats, parsing).
+    """
+    if is_pickle_path(db_path):
+        with open(db_path, 'rb') as f:
+            db = pickle.load(f)
+    else:
+        if not os.path.exists(db_path):
+            raise FileNotFoundError('No database found at {0}'.format(db_path))
+        db = ResultStore(db_path, readonly=readonly)
     print("Loaded database: {0} entries".format(len(db)))
     return db
 
 
-def get_name(email, single_string=False, df=None):
-    """Get dictionary of personal details from e-mail"""
-    if (df is None):
-        df = read_addresses()
+def migrate_database(pickle_path='database.pickle', db_path=DEFAULT_DB_PATH):
+    """Import a pickled database into the SQLite store"""
+    return migrate_pickle(pickle_path, db_path)
+
+
+def sanitize_string(s):
+    """Return the string, or a blank if invalid"""
+    try:
+        return s + ''
+    except TypeError:
+        return ''
+
+
+# Syntactically valid email address: local@domain.tld, without spaces
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s.]+$')
+
+
+def normalize_email(email):
+    """Return the email stripped and lowercased, None if it is not a valid address"""
+    if not isinstance(email, str):
+        return None
+    email = email.strip().lower()
+    if not _EMAIL_RE.match(email):
+        return None
+    return email
+
+
+class AddressBook:
+    """Personal details from addresses.csv, indexed by email.
+
+    The address table is scanned once when the book is built.
+    Lookups are then dictionary hits instead of a scan of the whole table.
+
+    Each entry holds the sanitized 'first', 'last', 'country' and 'company' fields,
+    both as written in addresses.csv and lowercased.
+    Emails are normalized (normalize_email): lookups ignore case and surrounding blanks.
+    If an email appears more than once, the first row wins.
+    """
+
+    fields = {
+        'first': 'FirstName',
+        'last': 'LastName',
+        'country': 'Country',
+        'company': 'CompanyName'
+    }
+
+    def __init__(self, df):
+        self._details = {}
+        self._lower = {}
 
-    row = df[df['EmailAddress'].values == email]
+        columns = [df[c].values for c in self.fields.values()]
+        for email, *values in zip(df['EmailAddress'].values, *columns):
+            email = self.key(email)
+            if email in self._details:
+                continue
+            details = dict(zip(self.fields.keys(), (sanitize_string(v) for v in values)))
+            self._details[email] = details
+            self._lower[email] = {k: v.lower() for k, v in details.items()}
 
-    def sanitize_string(s):
-        """Return the string, or a blank if invalid"""
-        try:
-            return s + ''
-        except TypeError:
-            return ''
+    @staticmethod
+    def key(email):
+        """Key of an email in the book: the normalized email, or the email itself if invalid"""
+        normalized = normalize_email(email)
+        return email if normalized is None else normalized
 
-    first = sanitize_string(row['FirstName'].values[0])
-    last = sanitize_string(row['LastName'].values[0])
-    company = sanitize_string(row['CompanyName'].values[0])
-    country = sanitize_string(row['Country'].values[0])
+    @classmethod
+    def from_csv(cls, addresses_path='addresses.csv'):
+        """Build the address book from addresses.csv"""
+        return cls(read_addresses(addresses_path))
+
+    def __len__(self):
+        return len(self._details)
+
+    def __contains__(self, email):
+        return self.key(email) in self._details
+
+    def __iter__(self):
+        return iter(self._details)
+
+    def get(self, email, lower=False):
+        """Get dictionary of personal details from e-mail.
+
+        Raise KeyError if the email is not in the book.
+        """
+        email = self.key(email)
+        if lower:
+            return dict(self._lower[email])
+        return dict(self._details[email])
+
+    def get_many(self, emails, lower=False):
+        """Get the personal details of several e-mails, in the same order"""
+        return [self.get(e, lower=lower) for e in emails]
+
+
+_address_books = {}
+
+
+def load_address_book(addresses_path='addresses.csv'):
+    """Return the address book of addresses_path, reading the .csv only the first time"""
+    if addresses_path not in _address_books:
+        _address_books[addresses_path] = AddressBook.from_csv(addresses_path)
+    return _address_books[addresses_path]
+
+
+def get_name(email, single_string=False, book=None):
+    """Get dictionary of personal details from e-mail
+
+    The details are looked up in the address book (default: the one of addresses.csv, read once).
+    """
+    if book is None:
+        book = load_address_book()
+
+    details = book.get(email)
 
     if single_string:
-        return first + ' ' + last
+        return details['first'] + ' ' + details['last']
     else:
-        return {
-            'first': first,
-            'last': last,
-            'country': country,
-            'company': company
-        }
+        return details
 
 
-def populate_database(db, query='email', write=True, db_path='database.pickle'):
-    """Fill the database with Google queries"""
-    emails = list(db.keys())
-    df = read_addresses()
+QUERY_TEMPLATES = {
+    'email': '{email}',
+    'name+surname+email': '{first} {last} "{email}"'
+}
 
-    print('Populating database: {0} records.'.format(len(db)))
 
-    for i, email in enumerate(emails):
-        print('Record {0} of {1}.'.format(i, len(emails)))
-        details = get_name(email, df=df)
+def make_query(email, details, query='email'):
+    """Create the Google query of an email, according to a template of QUERY_TEMPLATES"""
+    try:
+        template = QUERY_TEMPLATES[query]
+    except KeyError:
+        raise ValueError('query must be in {0}'.format(list(QUERY_TEMPLATES.keys())))
+    return template.format(email=email, first=details['first'], last=details['last'])
 
-        # Skip invalid fields
-        if not isinstance(email, str):
-            continue
 
-        # Skip already filled results
-        if db[email] is not None:
-            # print('Email {0} already known.'.format(email))
+def group_queries(jobs, book):
+    """Plan the Google queries of (email, query template) jobs before fetching.
+
+    Invalid emails are skipped, emails are normalized in the queries,
+    and emails with the same query string are grouped: each distinct query is fetched once.
+    Return a Dict query string -> list of emails (in order of first appearance).
+    """
+    groups = {}
+    n_jobs = 0
+    n_invalid = 0
+    for email, query in jobs:
+        n_jobs += 1
+        normalized = normalize_email(email)
+        if normalized is None:
+            n_invalid += 1
             continue
+        query_string = make_query(normalized, book.get(email), query)
+        groups.setdefault(query_string, []).append(email)
 
-        try:
-            # Create the Google query
-            dict_query = {
-                'email': email,
-                'name+surname+email': '{0} {1} "{2}"'.format(details['first'], details['last'], email)
-            }
-            try:
-                query_string = dict_query[query]
-            except KeyError as e:
-                print('query must be in {0}', list(dict_query.keys()))
+    print('Records to query: {0} ({1} invalid emails skipped), distinct queries: {2} ({3} requests saved).'.format(
+        n_jobs, n_invalid, len(groups), n_jobs - len(groups)))
+    return groups
 
-            print('Querying email {0} ({1}/{2}): query \'{3}\''.format(email, i, len(emails), query_string))
-            result = do_google_query(query_string)
 
-            # result is a list of GoogleResult objects
+def fetch_queries(jobs, n_jobs, archive=None, workers=1, rate=None, pages=1, stop=None):
+    """Run the Google queries of (email, query string) jobs.
 
-            print("Got {0} results.".format(len(result)))
-            db[email] = result
+    Yield (email, query string, list of GoogleResult, number of pages fetched) for every successful query.
+    Queries failing with an HTTP error are skipped; on 503 (too many requests) the VPN is refreshed and
+    the program exits.
+    See populate_database for archive, workers, rate, pages and stop.
+    """
+    # The rate limit applies to every page request
+    limiter = RateLimiter(rate) if rate else None
+    if workers > 1:
+        configure_http(pool_size=workers)
 
-            # Update after each query
-            if write:
-                write_database(db, db_path=db_path)
+    # Email of each query, for the stop condition
+    emails = {}
+
+    def tracked_jobs():
+        for email, query_string in jobs:
+            emails[query_string] = email
+            yield email, query_string
+
+    def fetch(query_string):
+        stop_query = None
+        if stop is not None:
+            email = emails[query_string]
+            stop_query = lambda results: stop(email, results)
+        return do_google_query_pages(query_string, archive=archive, pages=pages, stop=stop_query, limiter=limiter)
+
+    fetched = fetch_all(tracked_jobs(), fetch, workers=workers)
+
+    for i, (email, query_string, fetched_pages, error) in enumerate(fetched):
+        print('Queried email {0} ({1}/{2}): query \'{3}\''.format(email, i + 1, n_jobs, query_string))
 
-        except urllib.error.HTTPError as e:
-            print('Caught HTTP error: {0}'.format(e))
+        if error is not None:
+            if not isinstance(error, urllib.error.HTTPError):
+                raise error
 
-            if e.code == 503:
+            print('Caught HTTP error: {0}'.format(error))
+
+            if error.code == 503:
                 # Too many requests: must change IP
                 # TODO: do it automatically
+                fetched.close()
                 refresh_VPN()
                 sys.exit(-1)
+            continue
+
+        result, n_pages = fetched_pages
+        print("Got {0} results ({1} pages).".format(len(result), n_pages))
+        yield email, query_string, result, n_pages
+
+
+def store_results(db, records, query, db_path=DEFAULT_DB_PATH):
+    """Store records (Dict email -> list of GoogleResult) queried with a query template.
+
+    A ResultStore upserts them in a single transaction, with the template as their query plan (see planner.py),
+    whose certification is checked by plan_database.
+    A Dict is updated, then written to db_path (see write_database).
+    """
+    if isinstance(db, ResultStore):
+        db.update_many(records, tried=[query])
+    else:
+        db.update(records)
+        write_database(db, db_path=db_path)
+
+
+def populate_database(db, query='email', write=True, db_path=DEFAULT_DB_PATH, book=None, archive=None,
+                      workers=1, rate=None, pages=1, stop=None):
+    """Fill the database with Google queries
+
+    Records are stored after each query (see store_results), or all at once at the end if write is False.
+    db_path is only used by a Dict database.
+
+    If an HtmlArchive is given, the raw html of every fetched page is archived.
+
+    With workers > 1, queries are fetched concurrently by a pool of threads,
+    while results are written to the database by this function only.
+    rate caps the total number of requests per second, whatever the number of workers.
+
+    Up to `pages` pages of results are fetched for each query, one at a time:
+    if given, stop(email, results so far) is called after each page (in the fetching thread),
+    and the next pages are skipped once it returns True (see planner.certification_check).
+    """
+    if book is None:
+        book = load_address_book()
 
-    print('Finished populating database.')
+    print('Populating database: {0} records.'.format(len(db)))
+
+    # Skip already filled results, create the Google queries
+    # (invalid emails are skipped, identical queries are fetched once)
+    groups = group_queries(((e, query) for e in emails_not_queried(db)), book)
+    jobs = ((emails[0], query_string) for query_string, emails in groups.items())
+
+    # Records not stored yet
+    records = {}
+    n_requests = 0
+    try:
+        for _, query_string, result, n_pages in fetch_queries(jobs, len(groups), archive=archive, workers=workers,
+                                                              rate=rate, pages=pages, stop=stop):
+            n_requests += n_pages
+            # result is a list of GoogleResult objects, shared by all records with the same query
+            for email in groups[query_string]:
+                records[email] = list(result)
+
+            # Update after each query
+            # (a single transaction for a ResultStore, a full rewrite for a pickled Dict)
+            if write:
+                store_results(db, records, query, db_path=db_path)
+                records = {}
+    finally:
+        # Also when the run is stopped (e.g. too many requests): the queries already made are kept
+        if records:
+            store_results(db, records, query, db_path=db_path)
+
+    print('Finished populating database: {0} requests.'.format(n_requests))
+
+
+def merge_results(previous, results):
+    """Append to previous results the new ones, skipping already known links"""
+    if not previous:
+        return list(results)
+    links = {r.link for r in previous}
+    return list(previous) + [r for r in results if r.link not in links]
+
+
+def reparse_database(db, archive, query='email', book=None):
+    """Rebuild GoogleResults from the html archive, without querying Google
+
+    Records are matched to the archive by their Google query (built from the normalized email, as in group_queries).
+    Records with a query plan (see planner.py) are rebuilt from every query template they ran,
+    merged in the same order; the other records from the query template.
+    Records without archived pages, or with an invalid email, are left untouched.
+    """
+    if book is None:
+        book = load_address_book()
+
+    plans = db.plans() if isinstance(db, ResultStore) else {}
+
+    rebuilt = {}
+    for email in db.keys():
+        if not isinstance(email, str):
+            continue
+        normalized = normalize_email(email)
+        if normalized is None:
+            continue
+
+        tried = plans[email][0] if email in plans and plans[email][0] else [query]
+        results = None
+        for template in tried:
+            pages = archive.latest(make_query(normalized, book.get(email), template))
+            if pages:
+                results = merge_results(results, parse_google_pages(pages))
+        if results is not None:
+            rebuilt[email] = results
+
+    # Write all records at once
+    if isinstance(db, ResultStore):
+        db.update_many(rebuilt)
+    else:
+        db.update(rebuilt)
+
+    print('Reparsed {0} of {1} records from the archive.'.format(len(rebuilt), len(db)))
 
 
 def database_stats(db):
     """Compute basic stats on the database"""
-    emails = list(db.keys())
-
-    non_null = 0
-    for i, email in enumerate(emails):
-        if db[email] is not None:
-            non_null += 1
+    non_null = count_queried(db)
 
     print("Total entries: {0}".format(len(db)))
     print("Non-null entries: {0}".format(non_null))
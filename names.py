@@ -0,0 +1,88 @@
+"""
+Matching of personal names in page titles and links.
+
+Names and titles are normalized the same way: transliterated to ASCII (unidecode, as in GoogleResult),
+casefolded and split into alphanumeric tokens.
+The variants of a name are computed once per person (NameMatcher), the tokens of a title once per title:
+a name is found in a title if all the tokens of one of its variants are in the set of title tokens.
+A blank name (without any token) is never found.
+"""
+
+import functools
+import re
+import urllib.parse
+
+from unidecode import unidecode
+
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Transliterate to ASCII and casefold a string (None becomes '')"""
+    if not text:
+        return ''
+    return unidecode(text).casefold()
+
+
+def tokenize(text):
+    """List of the alphanumeric tokens of a normalized string"""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+@functools.lru_cache(maxsize=65536)
+def title_tokens(title):
+    """Set of tokens of a page title (memoized)"""
+    return frozenset(tokenize(title))
+
+
+@functools.lru_cache(maxsize=65536)
+def compact_link(link):
+    """Normalized link, without escapes nor separators (e.g. 'www.x.com/Jose-De-Luca' -> 'wwwxcomjosedeluca')"""
+    return ''.join(tokenize(urllib.parse.unquote(link or '')))
+
+
+def name_variants(name):
+    """Alternative token sets of a name.
+
+    Compound names match either as separate tokens or joined
+    (e.g. 'De Luca' -> {'de', 'luca'} or {'deluca'}).
+    A blank name has no variants.
+    """
+    tokens = tokenize(name)
+    if not tokens:
+        return ()
+    variants = [frozenset(tokens)]
+    if len(tokens) > 1:
+        variants.append(frozenset([''.join(tokens)]))
+    return tuple(variants)
+
+
+class NameMatcher:
+    """Normalized first and last name of a person, matched against title tokens"""
+
+    def __init__(self, first, last):
+        self.first = name_variants(first)
+        self.last = name_variants(last)
+        # Last name as it appears in a compacted link
+        self.lastCompact = ''.join(tokenize(last))
+
+    @staticmethod
+    def _matches(variants, tokens):
+        return any(v <= tokens for v in variants)
+
+    def first_in(self, tokens):
+        """True if the first name is in a set of title tokens"""
+        return self._matches(self.first, tokens)
+
+    def last_in(self, tokens):
+        """True if the last name is in a set of title tokens"""
+        return self._matches(self.last, tokens)
+
+    def full_in(self, tokens):
+        """True if both first and last names are in a set of title tokens"""
+        return self.first_in(tokens) and self.last_in(tokens)
+
+    def last_in_link(self, link):
+        """True if the last name appears in a link (never for a blank last name)"""
+        return bool(self.lastCompact) and self.lastCompact in compact_link(link)
@@ -3,13 +3,126 @@ Read the set of Google results stored in the database.
 
 Try to classify each Google result as LinkedIn/ResearchGate/personal page.
 
-Export results.csv containing parsed and certified data.
+Export results.csv containing parsed and certified data
+(or results.parquet / results.feather, see export.py).
 """
 
-from ingest import load_database, get_name
-import pandas
+from ingest import load_database, load_address_book
+from store import items_queried
+from blocklist import load_blocklist
+from names import NameMatcher, title_tokens
+from pipeline import chunked, map_ordered
+import export
+import collections
+import contextlib
+import functools
+import hashlib
+import heapq
+import io
+import json
 import re
+import signal
 import tldextract
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Version of the classification rules.
+# Increase it whenever parsing changes: fingerprints change, so incremental runs reparse every record.
+PARSER_VERSION = 6
+
+# Offline domain parser: uses the public suffix list bundled with tldextract,
+# never downloads it (nor caches it on disk)
+_tldExtractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+
+
+@functools.lru_cache(maxsize=65536)
+def registered_domain(host):
+    """Registered domain of a host (e.g. 'acme.co.uk' for 'www.acme.co.uk').
+
+    Memoized: hosts repeat a lot across results. Return None if host is None.
+    """
+    if host is None:
+        return None
+    components = _tldExtractor(host)
+    return components.domain + '.' + components.suffix
+
+
+# Maximum number of candidate GoogleResults kept per person and site
+MAX_CANDIDATES = 10
+
+# Links to documents are never personal pages
+DOCUMENT_EXTENSIONS = frozenset(['.pdf', '.doc', '.csv', '.xls'])
+
+# Lowercased title of a contact page
+CONTACT_PAGE_RE = re.compile('[ck]ontact')
+
+
+class PersonContext:
+    """Details of a person, computed once and shared by every classifier.
+
+    Holds the personal details from the address book, the lowercased company,
+    the normalized variants of the name (see names.py)
+    and the domain of the email (with its registered domain).
+    """
+
+    def __init__(self, email, nameDict):
+        self.email = email
+        # Personal details (first, last, country, company)
+        self.nameDict = nameDict
+
+        # Lowercased company, used for case-insensitive matching
+        self.companyLower = nameDict['company'].lower()
+
+        # Normalized first/last names, matched against titles and links
+        self.names = NameMatcher(nameDict['first'], nameDict['last'])
+
+        # Domain of the email address
+        self.emailDomain = email.split('@')[-1]
+        # Registered domain of the email address (e.g. acme.com for john@mail.acme.com)
+        self.emailRegisteredDomain = registered_domain(self.emailDomain)
+
+    @classmethod
+    def from_book(cls, email, book=None):
+        """Build the context of an email from the address book"""
+        if book is None:
+            book = load_address_book()
+        return cls(email, book.get(email))
+
+
+class SiteVerdict:
+    """Outcome of the classification of someone's GoogleResults for one site.
+
+    Built by PersonInformationResult.verdict(), used both for printing and for the summaries.
+    """
+
+    def __init__(self, key, siteName, certifiedResult=None, score=0.0, candidates=(), candidateScores=(), nCandidates=0):
+        # Key of the classifier, name of the site
+        self.key = key
+        self.siteName = siteName
+
+        # Certified GoogleResult (the best scoring one, None if none was found) and its score
+        self.certified = certifiedResult is not None
+        self.certifiedResult = certifiedResult
+        self.certifiedLink = certifiedResult.link if certifiedResult is not None else None
+        self.score = score
+
+        # Next best valid GoogleResults (at most MAX_CANDIDATES, best first) with their scores,
+        # and the total number of valid results besides the certified one
+        self.candidates = list(candidates)
+        self.candidateScores = list(candidateScores)
+        self.nCandidates = nCandidates
+
+    def print(self):
+        print('  {0}? {1} ({2} candidates): {3} ->> {4}'.format(
+            self.siteName,
+            self.certified,
+            self.nCandidates,
+            self.certifiedResult.name,
+            self.certifiedLink))
+        try:
+            print('     {0}'.format(self.certifiedResult.description[:30]))
+        except AttributeError:
+            pass
 
 
 class PersonInformationResult:
@@ -20,14 +133,35 @@ class PersonInformationResult:
     A GoogleResult is certified if we can extract information from it.
     If self.certified is False, the result is not verified and should NOT be exported.
 
-    There is only one certified result per person (the first one).
+    Each valid GoogleResult gets a score (score_result): the best ones are kept in a heap.
+    There is only one certified result per person (the best scoring one, the first one if tied).
     
-    self.candidates contains other candidate GoogleResults which satisfy criteria.
+    self.candidates contains the next best GoogleResults which satisfy criteria
+    (at most MAX_CANDIDATES, self.nCandidates counts all of them).
+
+    Derived classes declare the GoogleResults they handle, by host (see ClassifierRegistry):
+    only those are passed to validate_result.
     """
 
-    def __init__(self, email, siteName, results=None):
+    # Key of the classifier in the Dict returned by classify_Person
+    key = None
+    # Hosts handled by the classifier, including their subdomains (e.g. 'researchgate.net')
+    hosts = ()
+    # Domain labels handled by the classifier, whatever the suffix (e.g. 'linkedin' for linkedin.com, ch.linkedin.com, linkedin.de)
+    labels = ()
+    # True if the classifier handles the results not claimed by any other classifier
+    fallback = False
+
+    # Score of a valid GoogleResult, at most 1:
+    #   SCORE_BASE + weights of its features (score_features) + SCORE_RANK / (1 + rank in the results)
+    SCORE_BASE = 0.4
+    SCORE_RANK = 0.3
+
+    def __init__(self, person, siteName, results=None):
+        # Person associated to the Google search
+        self.person = person
         # Email associated to the Google search
-        self.email = email
+        self.email = person.email
         # Target website to locate information
         self.siteName = siteName
 
@@ -36,131 +170,275 @@ class PersonInformationResult:
         # Best matching GoogleResult
         self.certifiedResult = None
         self.certifiedLink = None
+        self.score = 0.0
         # Other matching GoogleResults
         self.candidates = []
+        self.candidateScores = []
+        self.nCandidates = 0
+
+        # Best valid GoogleResults: min-heap of (score, -rank, result)
+        self._best = []
 
         if results is not None:
             self.populateFromGoogleResults(results)
 
 
     def print(self):
-        print('  {0}? {1} ({2} candidates): {3} ->> {4}'.format(
-            self.siteName,
-            self.certified,
-            len(self.candidates),
-            self.certifiedResult.name,
-            self.certifiedLink))
-        try:
-            print('     {0}'.format(self.certifiedResult.description[:30]))
-        except AttributeError:
-            pass
+        self.verdict().print()
+
+    def verdict(self):
+        """Return the SiteVerdict of the GoogleResults seen so far"""
+        self._rank_best()
+        return SiteVerdict(self.key, self.siteName, self.certifiedResult, self.score,
+                           self.candidates, self.candidateScores, self.nCandidates)
+
+    def _rank_best(self):
+        """Set the certified result and the candidates from the heap of the best results"""
+        ranked = sorted(self._best, key=lambda b: b[:2], reverse=True)
+        self.certified = bool(ranked)
+        self.certifiedResult = ranked[0][2] if ranked else None
+        self.certifiedLink = self.certifiedResult.link if ranked else None
+        self.score = ranked[0][0] if ranked else 0.0
+        self.candidates = [b[2] for b in ranked[1:]]
+        self.candidateScores = [b[0] for b in ranked[1:]]
 
     def populateFromGoogleResults(self, results):
         """Parse a list of GoogleResults and find the most relevant."""
         self.candidates = []
+        self.candidateScores = []
+        self.nCandidates = 0
         self.certified = False
         self.certifiedResult = None
         self.certifiedLink = None
-
-        for r in results:
-            # Check if we can extract information from the GoogleResult 
-            valid = self.validate_result(r)
-
-            if valid:
-                # Multiple matches:
-                #   certify only the first result
-                #   append the others to candidates
-                if not self.certified:
-                    self.certified = True
-                    self.certifiedResult = r
-                    self.certifiedLink = r.link
-                else:
-                    self.candidates.append(r)
+        self.score = 0.0
+        self._best = []
+
+        for rank, r in enumerate(results):
+            if type(self) in CLASSIFIERS.route(r.domain):
+                self.add_result(r, rank)
+        self._rank_best()
+
+    def add_result(self, result, rank):
+        """Score a GoogleResult (rank: its position in the results), keep it if it is among the best.
+        The result must be handled by this classifier."""
+        # Check if we can extract information from the GoogleResult
+        score = self.score_result(result, rank)
+        if score <= 0:
+            return
+
+        # Keep the certified result and at most MAX_CANDIDATES candidates:
+        # the heap drops the worst one (the last one if tied)
+        if self._best:
+            self.nCandidates += 1
+        entry = (score, -rank, result)
+        if len(self._best) <= MAX_CANDIDATES:
+            heapq.heappush(self._best, entry)
+        else:
+            heapq.heappushpop(self._best, entry)
+
+    def score_result(self, result, rank=0):
+        """Score of a GoogleResult, 0 if it is not valid."""
+        if not self.validate_result(result):
+            return 0.0
+        return self.SCORE_BASE + self.score_features(result) + self.SCORE_RANK / (1 + rank)
+
+    def score_features(self, result):
+        """Sum of the weights of the features of a valid GoogleResult.
+        Overwritten by derived classes."""
+        return 0.0
 
     def validate_result(self, result):
         """Return True if we can extract information from a GoogleResult.
         Must be overwritten by derived classes."""
         raise NotImplementedError()
 
+
+class ClassifierRegistry:
+    """Registered PersonInformationResult classes, indexed by the hosts they handle.
+
+    The host of a GoogleResult is routed to the classifiers declaring it (or one of its
+    parent domains, or one of its labels); hosts claimed by no classifier go to the fallback classifiers.
+    Routes are computed once per host.
+    """
+
+    def __init__(self):
+        self.classifiers = []
+        # host -> classifiers, label -> classifiers
+        self._hosts = {}
+        self._labels = {}
+        self._fallback = []
+        # Cache: host -> tuple of classifiers
+        self._routes = {}
+
+    def __iter__(self):
+        return iter(self.classifiers)
+
+    def register(self, cls):
+        """Register a classifier (usable as a class decorator)"""
+        self.classifiers.append(cls)
+        for host in cls.hosts:
+            self._hosts.setdefault(host, []).append(cls)
+        for label in cls.labels:
+            self._labels.setdefault(label, []).append(cls)
+        if cls.fallback:
+            self._fallback.append(cls)
+        self._routes.clear()
+        return cls
+
+    def route(self, host):
+        """Return the tuple of classifiers handling a host (None if the link has no host)"""
+        try:
+            return self._routes[host]
+        except KeyError:
+            pass
+
+        matched = set()
+        if host is not None:
+            parts = host.split('.')
+            for i in range(len(parts)):
+                matched.update(self._hosts.get('.'.join(parts[i:]), ()))
+            # The last label is the top-level domain
+            for label in parts[:-1]:
+                matched.update(self._labels.get(label, ()))
+        if not matched:
+            matched = self._fallback
+
+        # Keep the registration order
+        route = tuple(cls for cls in self.classifiers if cls in matched)
+        self._routes[host] = route
+        return route
+
+
+CLASSIFIERS = ClassifierRegistry()
+
 # -------------------
 # Derived classes for each GoogleResult.
 #
 # They define how to extract information from a GoogleResult according to website types.    
 
 
+@CLASSIFIERS.register
 class LinkedInResult(PersonInformationResult):
     """Get somebody's LinkedIn details"""
 
-    def __init__(self, email, results):
-        super().__init__(email=email, siteName='LinkedIn', results=results)
+    key = 'linkedin'
+    labels = ('linkedin',)
 
-    def validate_result(self, result):
-        if not ('linkedin.' in result.link):
-            return False
+    # Links of profile pages, and of public directory pages (never valid)
+    PROFILE_PATH = '/in/'
+    PUBLIC_PATH = '/pub/'
+
+    # Feature weights: profile page, last name in the link
+    WEIGHT_PROFILE = 0.15
+    WEIGHT_LAST_IN_LINK = 0.15
 
-        nameDict = get_name(self.email)
-        valid = is_nameInTitle(result, nameDict)
-        valid = valid and r'/pub/' not in result.link
-        valid = valid and nameDict['company'].lower() in result.description.lower()
+    def __init__(self, person, results):
+        super().__init__(person=person, siteName='LinkedIn', results=results)
+
+    def validate_result(self, result):
+        valid = is_nameInTitle(result, self.person)
+        valid = valid and self.PUBLIC_PATH not in result.link
+        valid = valid and is_companyInDescription(result, self.person)
         return valid
 
+    def score_features(self, result):
+        score = 0.0
+        if self.PROFILE_PATH in result.link:
+            score += self.WEIGHT_PROFILE
+        if is_lastNameInLink(result, self.person):
+            score += self.WEIGHT_LAST_IN_LINK
+        return score
 
+
+@CLASSIFIERS.register
 class ResearchGateResult(PersonInformationResult):
     """Get somebody's ResearchGate details"""
 
-    def __init__(self, email, results):
-        super().__init__(email=email, siteName='ResearchGate', results=results)
+    key = 'researchgate'
+    hosts = ('researchgate.net',)
 
-    def validate_result(self, result):
-        if 'researchgate.net' not in result.link:
-            return False
+    # Links of profile pages
+    PROFILE_PATH = '/profile/'
+
+    # Feature weights: company in the description
+    WEIGHT_COMPANY = 0.3
+
+    def __init__(self, person, results):
+        super().__init__(person=person, siteName='ResearchGate', results=results)
 
-        nameDict = get_name(self.email)
-        valid = is_nameInTitle(result, nameDict)
-        valid = valid and r'/profile/' in result.link and nameDict['last'] in result.link
+    def validate_result(self, result):
+        valid = is_nameInTitle(result, self.person)
+        valid = valid and self.PROFILE_PATH in result.link and is_lastNameInLink(result, self.person)
         return valid
 
+    def score_features(self, result):
+        score = 0.0
+        if is_companyInDescription(result, self.person):
+            score += self.WEIGHT_COMPANY
+        return score
+
 
+@CLASSIFIERS.register
 class PersonalPageResult(PersonInformationResult):
-    """Get somebody's personal page (experimental)"""
+    """Get somebody's personal page (experimental)
+
+    Handles the results of all sites without a dedicated classifier."""
+
+    key = 'personal'
+    fallback = True
 
-    def __init__(self, email, results):
-        super().__init__(email=email, siteName='personal page', results=results)
+    # Forbidden domains (social networks, aggregators...), see blocklist.txt
+    blocklist_path = None
+
+    # Feature weights: contact page, same domain as the email, last name in the link
+    WEIGHT_CONTACT = 0.1
+    WEIGHT_SAME_DOMAIN = 0.1
+    WEIGHT_LAST_IN_LINK = 0.1
+
+    def __init__(self, person, results):
+        super().__init__(person=person, siteName='personal page', results=results)
 
     def validate_result(self, result):
         # Skip documents
         linkExt = result.link[-4:]
-        if linkExt in ['.pdf', '.doc', '.csv', '.xls', '.doc']:
+        if linkExt in DOCUMENT_EXTENSIONS:
             return False
 
         # Forbidden domains
-        domains = ['facebook', 'twitter', 'holaconnect', 'crunchbase', 'namenfinden']
-        if any(d in result.link for d in domains):
+        if result.domain in self.blocklist():
             return False
 
-        # Parse domains from email and link
-        emailDomain = self.email.split('@')[-1]
-        linkComponents = tldextract.extract(result.link)
-
         # Personal page must contain his name/surname somewhere in the title
-        nameDict = get_name(self.email)
-
-        valid = (nameDict['first'].lower() in result.name.lower() or
-                 nameDict['last'].lower() in result.name.lower())
+        person = self.person
+        titleTokens = title_tokens(result.name)
+        valid = person.names.first_in(titleTokens) or person.names.last_in(titleTokens)
 
         # Company must be contained in link description
-        valid = valid and nameDict['company'].lower() in result.description.lower()
+        valid = valid and is_companyInDescription(result, person)
 
         # Must be a contact page
-        v1 = re.match('[ck]ontact', result.name.lower())
-        # Email should have the same domain as the link
-        v2 = (emailDomain == (linkComponents.domain + '.' + linkComponents.suffix))
+        # or email should have the same domain as the link
         # or last name contained in link
-        v3 = nameDict['last'].lower() in result.link
-
-        valid = valid and (v1 or v2 or v3)
+        valid = valid and (is_contactPage(result) or is_sameDomain(result, person) or is_lastNameInLink(result, person))
         return valid
 
+    def score_features(self, result):
+        score = 0.0
+        if is_contactPage(result):
+            score += self.WEIGHT_CONTACT
+        if is_sameDomain(result, self.person):
+            score += self.WEIGHT_SAME_DOMAIN
+        if is_lastNameInLink(result, self.person):
+            score += self.WEIGHT_LAST_IN_LINK
+        return score
+
+    @classmethod
+    def blocklist(cls):
+        """Compiled blocklist of forbidden domains"""
+        if cls.blocklist_path is None:
+            return load_blocklist()
+        return load_blocklist(cls.blocklist_path)
+
 
 # -------------------
 # GoogleResult-class functions
@@ -169,33 +447,60 @@ class PersonalPageResult(PersonInformationResult):
 # is_* return TRUE if a given GoogleResult satisfies a given criterium
 
 
-def is_nameInTitle(result, name):
-    """Somebody's name is mentioned in the webpage title"""
-    return [name['first'].lower() in result.name.lower() and
-            name['last'].lower() in result.name.lower()]
+def is_nameInTitle(result, person):
+    """Somebody's name (first and last) is mentioned in the webpage title,
+    ignoring case and accents"""
+    return person.names.full_in(title_tokens(result.name))
+
+
+def is_companyInDescription(result, person):
+    """Somebody's company is mentioned in the result description"""
+    return person.companyLower in result.description.lower()
+
+
+def is_lastNameInLink(result, person):
+    """Somebody's last name appears in the link"""
+    return person.names.last_in_link(result.link)
+
+
+def is_contactPage(result):
+    """The webpage title starts with contact/kontakt"""
+    return CONTACT_PAGE_RE.match(result.name.lower()) is not None
+
+
+def is_sameDomain(result, person):
+    """The link has the same registered domain as somebody's email"""
+    return person.emailRegisteredDomain == registered_domain(result.domain)
 
 # -------------------
 # Printing functions
 
 
-def print_Person(email, results, linkedin=False, personal=False, researchgate=False):
-    """Print someone's details"""
+def classify_Person(person, results):
+    """Classify someone's GoogleResults for every site, return a Dict key -> SiteVerdict.
+
+    Results are scanned once: each one is passed only to the classifiers handling its host.
+    """
+    classifiers = {cls.key: cls(person, None) for cls in CLASSIFIERS}
+    for rank, r in enumerate(results):
+        for cls in CLASSIFIERS.route(r.domain):
+            classifiers[cls.key].add_result(r, rank)
+    return {key: c.verdict() for key, c in classifiers.items()}
 
-    nn = get_name(email)
 
-    ll = LinkedInResult(email, results)
-    pp = PersonalPageResult(email, results)
-    rg = ResearchGateResult(email, results)
+def print_Person(person, verdicts, linkedin=False, personal=False, researchgate=False):
+    """Print someone's details, given the SiteVerdicts from classify_Person"""
+    nn = person.nameDict
 
     print("*** {0} {1} @ {2} - {3} ***".format(
-        nn['first'], nn['last'], nn['company'], email))
+        nn['first'], nn['last'], nn['company'], person.email))
 
-    if linkedin and ll.certified:
-        ll.print()
-    if personal and pp.certified:
-        pp.print()
-    if researchgate and rg.certified:
-        rg.print()
+    if linkedin and verdicts['linkedin'].certified:
+        verdicts['linkedin'].print()
+    if personal and verdicts['personal'].certified:
+        verdicts['personal'].print()
+    if researchgate and verdicts['researchgate'].certified:
+        verdicts['researchgate'].print()
 
 
 def print_Results(results):
@@ -206,53 +511,54 @@ def print_Results(results):
         # print('   {0}'.format(r.description))
 
 
-def parseAdvanced(email, results):
-    """Advanced parser. Look at all results in first page, locate info, return a Dict to export."""
+def confidence(verdict):
+    """Exported confidence of a SiteVerdict: score of the certified result (rounded), None if not certified"""
+    return round(verdict.score, 3) if verdict.certified else None
 
-    print_Person(email, results, researchgate=True, personal=True)
-    name = get_name(email)
 
-    # Start classifying obtained GoogleResults
-
-    # Linkedin
-    ll = LinkedInResult(email, results)
-    # lr = ll.certifiedResult
+def parseAdvanced(person, results):
+    """Advanced parser. Look at all results in first page, locate info, return a Dict to export."""
 
-    # Personal pages
-    pp = PersonalPageResult(email, results)
-    # lp = pp.certifiedResult
+    # Classify obtained GoogleResults in one pass
+    # (Linkedin, personal pages, ResearchGate)
+    verdicts = classify_Person(person, results)
+    ll = verdicts['linkedin']
+    pp = verdicts['personal']
+    rg = verdicts['researchgate']
 
-    # ResearchGate
-    rg = ResearchGateResult(email, results)
-    # lr = rg.certifiedResult
+    print_Person(person, verdicts, researchgate=True, personal=True)
+    name = person.nameDict
 
     # Summarize results
     summary = {}
-    summary['email'] = email
+    summary['email'] = person.email
     summary['firstName'] = name['first']
     summary['lastName'] = name['last']
     summary['company'] = name['company']
 
     summary['linkedinCertified'] = ll.certified
     summary['linkedinLink'] = ll.certifiedLink
+    summary['linkedinConfidence'] = confidence(ll)
 
     summary['personalCertified'] = pp.certified
     summary['personalLink'] = pp.certifiedLink
+    summary['personalConfidence'] = confidence(pp)
 
     summary['researchgateCertified'] = rg.certified
     summary['researchgateLink'] = rg.certifiedLink
+    summary['researchgateConfidence'] = confidence(rg)
 
     return summary
 
 
-def parseFirstResult(email, results):
+def parseFirstResult(person, results):
     """Simple parser. Simply return a Dict with the first Google result."""
 
-    name = get_name(email)
-    print_Person(email, results)
+    name = person.nameDict
+    print_Person(person, {})
 
     summary = {}
-    summary['email'] = email
+    summary['email'] = person.email
     summary['firstName'] = name['first']
     summary['lastName'] = name['last']
     summary['company'] = name['company']
@@ -262,54 +568,243 @@ def parseFirstResult(email, results):
     return summary
 
 
-def parseResults(db, parse_mode):
+# -------------------
+# Parallel parsing
+#
+# Records are sent to a pool of processes in chunks.
+# Each worker receives the address book once, when it starts.
+
+# Address book of the worker process
+_worker_book = None
+
+
+def _init_worker(book):
+    """Initialize a worker process: store the address book, leave interrupts to the parent"""
+    global _worker_book
+    _worker_book = book
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _parse_chunk(parserFcn, chunk):
+    """Parse a chunk of (email, results) in a worker process.
+
+    Return the list of (summary, printed output): the parent prints the output in order.
+    """
+    parsed = []
+    for e, results in chunk:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            person = PersonContext.from_book(e, _worker_book)
+            summary = parserFcn(person, results)
+        parsed.append((summary, output.getvalue()))
+    return parsed
+
+
+def _parse_chunk_batch(parse_mode, chunk):
+    """Parse a chunk of (email, results) with the vectorized engine in a worker process"""
+    import parse_batch
+    return [(summary, '') for summary in parse_batch.summarize(chunk, parse_mode, _worker_book)]
+
+
+def iter_summaries(records, parserFcn, book, workers=1, chunk_size=64, engine='objects', parse_mode=None):
+    """Parse (email, results) records, yield summaries in the order of records.
+
+    engine 'objects' builds the classifiers of each person (parserFcn);
+    engine 'pandas' parses chunks of chunk_size records at once with parse_batch (parse_mode), printing nothing.
+    With workers > 1, records are parsed in a pool of processes, chunk_size records at a time.
+    """
+    if engine == 'pandas':
+        # Imported here: parse_batch depends on this module
+        import parse_batch
+        parseChunk = functools.partial(_parse_chunk_batch, parse_mode)
+    else:
+        parseChunk = functools.partial(_parse_chunk, parserFcn)
+
+    if workers <= 1:
+        if engine == 'pandas':
+            for chunk in chunked(records, chunk_size):
+                yield from parse_batch.summarize(chunk, parse_mode, book)
+            return
+
+        for e, results in records:
+            # Personal details are computed once and shared by all classifiers
+            person = PersonContext.from_book(e, book)
+            yield parserFcn(person, results)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(book,))
+    try:
+        chunks = map_ordered(executor, parseChunk,
+                             chunked(records, chunk_size), max_pending=2 * workers)
+        for parsed in chunks:
+            for summary, output in parsed:
+                print(output, end='')
+                yield summary
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# -------------------
+# Incremental parsing
+#
+# A record is parsed again only if its fingerprint changed since the previous export.
+
+
+def record_fingerprint(parse_mode, nameDict, results):
+    """Hash of everything a summary depends on:
+    parser version and mode, blocklist, personal details, stored GoogleResults"""
+    content = [
+        PARSER_VERSION,
+        PersonalPageResult.blocklist().digest,
+        parse_mode,
+        sorted(nameDict.items()),
+        [[getattr(r, f) for f in r.FIELDS] for r in results]
+    ]
+    return hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()
+
+
+def iter_incremental(records, parse, parse_mode, book, previous, fingerprints, new_fingerprints):
+    """Yield summaries of records in order, reusing the previous summaries of unchanged records.
+
+    Only changed or new records are passed to parse (e.g. iter_summaries), which must yield
+    their summaries in order.
+    previous and fingerprints come from the previous export.
+    The fingerprints of all records are stored in new_fingerprints.
+    """
+    # Previous summary of each record, or None for records being parsed
+    order = collections.deque()
+
+    def changed():
+        for e, results in records:
+            fingerprint = record_fingerprint(parse_mode, book.get(e), results)
+            new_fingerprints[e] = fingerprint
+            if e in previous and fingerprints.get(e) == fingerprint:
+                order.append(previous[e])
+            else:
+                order.append(None)
+                yield e, results
+
+    for summary in parse(changed()):
+        while order[0] is not None:
+            yield order.popleft()
+        order.popleft()
+        yield summary
+
+    # Only unchanged records are left
+    yield from order
+
+
+# Engines computing summaries: classifier objects, or vectorized (parse_batch.py)
+ENGINES = ['objects', 'pandas']
+
+
+def parseResults(db, parse_mode, book=None, file_format='csv', batch_size=1000, resume=False, workers=1,
+                 incremental=False, engine='objects'):
     """Extract info from filled database and export.
 
     Load the database with stored Google results.
-    Parse each result and instantiate corresponding objects.
-    Export at the end.
+    Parse each result and instantiate corresponding objects
+    (in a pool of processes if workers > 1; summaries keep the order of the database).
+
+    CSV export (results.csv) is streamed: summaries are written every batch_size records
+    and checkpointed, so that an interrupted run can be continued with resume=True.
+    Columnar export (file_format 'parquet' or 'feather') is written at the end.
+
+    engine 'pandas' computes the same summaries with vectorized operations on chunks of records
+    (faster on large databases, without printing each person).
+
+    With incremental=True, only the records whose results (or personal details) changed
+    since the previous export are parsed again; the other summaries are copied from it.
     """
-    emails = list(db.keys())
-    emailsValid = [e for e in emails if db[e] is not None]
+    if book is None:
+        book = load_address_book()
+
+    dict_parser = {
+        'first': parseFirstResult,
+        'advanced': parseAdvanced
+    }
+    try:
+        parserFcn = dict_parser[parse_mode]
+    except KeyError:
+        raise ValueError('parse_mode must be in {0}'.format(list(dict_parser.keys())))
+    if engine not in ENGINES:
+        raise ValueError('engine must be in {0}'.format(ENGINES))
+
+    path = 'results.' + file_format
+    if incremental and resume:
+        raise ValueError('An incremental run cannot be resumed: run it again instead')
+
+    # The previous export must be read before it is overwritten
+    previous = export.read_summaries(path, file_format) if incremental else {}
+    fingerprints = export.read_fingerprints(path) if incremental else {}
+    new_fingerprints = {}
+
+    if file_format == 'csv':
+        writer = export.CsvSummaryWriter(path, batch_size=batch_size, resume=resume, tag=parse_mode)
+        if writer.last_email is not None:
+            print('Resuming after {0} ({1} records already parsed)'.format(writer.last_email, writer.count))
+
+        # Records written before the checkpoint were parsed by the interrupted run:
+        # their fingerprints are computed again, so that the next incremental run can reuse them
+        def fingerprint_skipped(e, results):
+            new_fingerprints[e] = record_fingerprint(parse_mode, book.get(e), results)
+
+        records = export.skip_until(items_queried(db), writer.last_email, skipped=fingerprint_skipped)
+    elif resume:
+        raise ValueError('Only the CSV export can be resumed')
+    else:
+        writer = None
+        records = items_queried(db)
+
+    def parse(records):
+        if engine == 'pandas':
+            return iter_summaries(records, parserFcn, book, workers=workers, chunk_size=batch_size,
+                                  engine=engine, parse_mode=parse_mode)
+        return iter_summaries(records, parserFcn, book, workers=workers)
+
+    # Fingerprints are computed on every run, so that any export can be the base of an incremental run
+    all_summaries = iter_incremental(records, parse, parse_mode, book, previous, fingerprints, new_fingerprints)
 
     # Show and store summary stats
     summaries = []
     try:
-        for e in emailsValid:
-            results = db[e]
-
-            dict_parser = {
-                'first': parseFirstResult,
-                'advanced': parseAdvanced
-            }
-            try:
-                parserFcn = dict_parser[parse_mode]
-            except KeyError as e:
-                print('parse_mode must be in {0}', list(dict_parser.keys()))
-
-            summary = parserFcn(e, results)
+        # Records are read one at a time
+        for summary in all_summaries:
 
             # Parse the first page using the heuristic parser
-            # summary = parseAdvanced(e, results)
+            # summary = parseAdvanced(person, results)
 
             # Return only the first result
-            # summary = parseFirstResult(e, results)
+            # summary = parseFirstResult(person, results)
 
-            summaries.append(summary)
+            if writer is not None:
+                writer.write(summary)
+            else:
+                summaries.append(summary)
 
         # Export dataframe
         print('Exporting dataframe...')
-        df_summaries = pandas.DataFrame(summaries)
-        df_summaries.to_csv('results.csv', sep=';', index=False)
+        if writer is not None:
+            writer.finish()
+        else:
+            export.export_summaries(summaries, path, file_format)
+        export.write_fingerprints(path, new_fingerprints)
+        if incremental:
+            reused = sum(1 for e in new_fingerprints if e in previous and fingerprints.get(e) == new_fingerprints[e])
+            print('{0} records parsed, {1} unchanged'.format(len(new_fingerprints) - reused, reused))
         print('Done.')
 
     except KeyboardInterrupt:
         print('')
         print('*** Aborting (interrupt) ***')
+        if writer is not None:
+            # Keep the summaries parsed so far
+            writer.close()
+            print('{0} records saved to {1}, continue with --resume'.format(writer.count, writer.path))
 
 
 if __name__ == '__main__':
-    db = load_database('database.pickle')
+    db = load_database(readonly=True)
 
    # Return only the first result
     parseResults(db, 'first')
@@ -0,0 +1,364 @@
+"""
+Vectorized engine for parse.py.
+
+Instead of building classifier objects for each person, a chunk of records is flattened into
+columns (one row per GoogleResult, with the position of its person in the chunk).
+The predicates of the classifiers and the scores of the results are computed on whole columns:
+- a column of texts is lowercased / normalized as in names.py all at once
+  (joined into one string, one line per row; only the runs of non-ASCII characters are transliterated),
+- substring tests (link patterns, company in description, last name in link,
+  name tokens in title tokens) are mapped over whole columns with operator.contains,
+- host lookups (routing, blocklist, registered domain) run once per distinct host.
+Names and links are only matched on the rows which pass the cheaper tests (e.g. company in description).
+The certified link of each site is the best scoring valid row of each email (the first one if tied).
+
+Summaries are the same as the ones of parseAdvanced / parseFirstResult.
+The rules of each classifier are written again in validate (with the patterns and weights of parse.py):
+a classifier registered in parse.CLASSIFIERS but missing from SITES raises NotImplementedError.
+Nothing is printed.
+"""
+
+import functools
+import itertools
+import operator
+import re
+import string
+import urllib.parse
+
+import numpy
+import pandas
+from unidecode import unidecode
+
+from names import normalize
+from parse import (CLASSIFIERS, CONTACT_PAGE_RE, DOCUMENT_EXTENSIONS, LinkedInResult, PersonalPageResult,
+                   ResearchGateResult, registered_domain)
+
+
+# Keys of the classifiers implemented by validate
+SITES = ('linkedin', 'personal', 'researchgate')
+
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]+')
+# Normalized text -> tokens of names.tokenize separated by spaces (line breaks separate rows)
+_SEPARATORS = str.maketrans({c: ' ' for c in map(chr, range(128))
+                             if c not in string.ascii_lowercase + string.digits + '\n'})
+# Tokens of names.tokenize, and row ends
+_TOKENS_RE = re.compile(r'[a-z0-9]+|\n')
+
+
+def results_frame(records):
+    """Flatten (email, results) records into a DataFrame, one row per GoogleResult, in order.
+
+    Column person is the position of the record in records."""
+    flat = [r for _, results in records for r in results]
+    df = pandas.DataFrame({
+        'name': [r.name for r in flat],
+        'link': [r.link for r in flat],
+        'description': [r.description for r in flat],
+        'domain': [r.domain for r in flat]
+    }, dtype=object)
+    df['person'] = numpy.repeat(numpy.arange(len(records)), [len(results) for _, results in records])
+    return df
+
+
+def persons_frame(emails, book):
+    """DataFrame of personal details (as in PersonContext), indexed by email"""
+    details = book.get_many(emails)
+    persons = pandas.DataFrame({
+        'first': [d['first'] for d in details],
+        'last': [d['last'] for d in details],
+        'company': [d['company'] for d in details],
+        'emailDomain': [e.split('@')[-1] for e in emails]
+    }, index=pandas.Index(emails, name='email'), dtype=object)
+
+    persons['companyLower'] = lower_lines(persons['company'])
+    persons['emailRegisteredDomain'] = map_unique(persons['emailDomain'], registered_domain)
+    return persons
+
+
+def map_unique(values, fcn):
+    """Apply fcn to every distinct value of a column (None included), return an array"""
+    codes, uniques = pandas.factorize(values)
+    # Missing values have code -1: the last element
+    mapped = [fcn(u) for u in uniques] + [fcn(None)]
+    return numpy.array(mapped, dtype=object)[codes]
+
+
+def objects(values):
+    """numpy array of Python objects"""
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def contains(haystacks, needles):
+    """Row-wise substring test: needles[i] in haystacks[i] (needles can be a single string)"""
+    if isinstance(needles, str):
+        needles = itertools.repeat(needles)
+    return numpy.fromiter(map(operator.contains, haystacks, needles), dtype=bool, count=len(haystacks))
+
+
+# -------------------
+# Columns of texts, processed as a single string: one line per value
+
+
+def _lines(texts):
+    return ['' if t is None else t for t in texts]
+
+
+def lower_lines(texts):
+    """str.lower of every value of a column (missing values become '')"""
+    texts = _lines(texts)
+    lines = '\n'.join(texts).lower().split('\n')
+    if len(lines) != len(texts):
+        # Line breaks inside values: one value at a time
+        lines = [t.lower() for t in texts]
+    return lines
+
+
+@functools.lru_cache(maxsize=65536)
+def _transliterate(text):
+    return unidecode(text)
+
+
+def normalize_lines(texts, unquote=False):
+    """names.normalize of every value of a column (after urllib.parse.unquote if unquote is True).
+
+    Line breaks inside values become spaces (they only separate tokens).
+    """
+    texts = _lines(texts)
+    text = '\n'.join(texts)
+    if unquote:
+        text = urllib.parse.unquote(text)
+    lines = _NON_ASCII_RE.sub(lambda m: _transliterate(m.group()), text).casefold().split('\n')
+    if len(lines) != len(texts):
+        # Line breaks inside values: one value at a time
+        if unquote:
+            texts = [urllib.parse.unquote(t) for t in texts]
+        lines = [normalize(t).replace('\n', ' ') for t in texts]
+    return lines
+
+
+def token_lines(normalized):
+    """Tokens of every normalized value (as in names.tokenize), between spaces: ' token1 token2 ... '"""
+    return (' ' + ' \n '.join(normalized).translate(_SEPARATORS) + ' ').split('\n')
+
+
+def compact_lines(normalized):
+    """Every normalized value without separators (as in names.compact_link)"""
+    return '\n'.join(normalized).translate(_SEPARATORS).replace(' ', '').split('\n')
+
+
+# -------------------
+# Name matching
+
+
+def name_tokens(persons):
+    """Tokens of the name variants of every person (see names.name_variants), grouped by person.
+
+    Return (start, count, token, variant): the tokens of person i are token[start[i]:start[i] + count[i]],
+    each one between spaces (as in token_lines); variant is 0/1 (first name tokens / joined) or 2/3
+    (last name tokens / joined).
+    """
+    person, token, variant = [], [], []
+    for v, column in [(0, 'first'), (2, 'last')]:
+        normalized = normalize_lines(persons[column])
+
+        # Tokens of each name, with the position of their person
+        items = numpy.array(_TOKENS_RE.findall('\n'.join(normalized)), dtype=object)
+        isEnd = items == '\n'
+        itemPerson = numpy.cumsum(isEnd)[~isEnd]
+        person.append(itemPerson)
+        token.append(items[~isEnd])
+        variant.append(numpy.full(len(itemPerson), v))
+
+        # Compound names also match joined
+        compound = numpy.flatnonzero(numpy.bincount(itemPerson, minlength=len(persons)) > 1)
+        person.append(compound)
+        token.append(numpy.array(compact_lines(normalized), dtype=object)[compound])
+        variant.append(numpy.full(len(compound), v + 1))
+
+    person = numpy.concatenate(person)
+    order = numpy.argsort(person, kind='stable')
+    count = numpy.bincount(person, minlength=len(persons))
+    start = numpy.cumsum(count) - count
+    token = numpy.concatenate(token)[order]
+    return start, count, objects([' ' + t + ' ' for t in token]), numpy.concatenate(variant)[order]
+
+
+def match_names(titles, rowPerson, names):
+    """Test the names of the persons of some rows against their titles.
+
+    Return two boolean arrays: first name in title, last name in title (see names.NameMatcher).
+    """
+    n = len(titles)
+    start, count, token, variant = names
+    titleTokens = objects(token_lines(normalize_lines(titles)))
+
+    # One row per (title, token of a name variant of its person)
+    nameCount = count[rowPerson]
+    nameRow = numpy.repeat(numpy.arange(n), nameCount)
+    nameIndex = (numpy.repeat(start[rowPerson] - (numpy.cumsum(nameCount) - nameCount), nameCount)
+                 + numpy.arange(nameCount.sum()))
+
+    # Whole tokens: ' token ' in ' title tokens '
+    found = contains(titleTokens[nameRow], token[nameIndex])
+
+    # Tokens of each name variant found in each title, out of the total
+    group = nameRow * 4 + variant[nameIndex]
+    nFound = numpy.bincount(group, weights=found, minlength=4 * n).reshape(n, 4)
+    nTotal = numpy.bincount(group, minlength=4 * n).reshape(n, 4)
+
+    # A name without tokens is never found; joined variants only exist for compound names
+    matched = (nFound == nTotal) & (nTotal > 0)
+    return matched[:, 0] | matched[:, 1], matched[:, 2] | matched[:, 3]
+
+
+def validate(df, persons):
+    """Compute the validity and the score of every row for each classifier.
+
+    Return a Dict classifier key -> (boolean array, score array),
+    mirroring the validate_result and score_result methods.
+    """
+    n = len(df)
+    rowPerson = df['person'].to_numpy()
+    link = _lines(df['link'].tolist())
+    titleLower = lower_lines(df['name'].tolist())
+
+    # Classifiers handling each host
+    routes = map_unique(df['domain'], lambda host: {cls.key for cls in CLASSIFIERS.route(host)})
+    handled = {cls.key: numpy.array([cls.key in r for r in routes], dtype=bool) for cls in CLASSIFIERS}
+
+    companyLower = persons['companyLower'].to_numpy()[rowPerson]
+    companyInDescription = (df['description'].notna().to_numpy()
+                            & contains(lower_lines(df['description'].tolist()), companyLower))
+    profileLink = contains(link, LinkedInResult.PROFILE_PATH)
+    researchgateProfile = contains(link, ResearchGateResult.PROFILE_PATH)
+
+    # Names are only matched where a result can still be valid
+    candidates = numpy.flatnonzero(
+        (companyInDescription & (handled['linkedin'] | handled['personal']))
+        | (handled['researchgate'] & researchgateProfile))
+
+    # Same name matching as is_nameInTitle, is_lastNameInLink and the classifiers (names.py)
+    firstInTitle = numpy.zeros(n, dtype=bool)
+    lastInTitle = numpy.zeros(n, dtype=bool)
+    lastInLink = numpy.zeros(n, dtype=bool)
+    if len(candidates):
+        candidatePerson = rowPerson[candidates]
+        firstInTitle[candidates], lastInTitle[candidates] = match_names(
+            df['name'].to_numpy()[candidates], candidatePerson, name_tokens(persons))
+
+        linkCompact = compact_lines(normalize_lines(df['link'].to_numpy()[candidates], unquote=True))
+        lastCompact = numpy.array(compact_lines(normalize_lines(persons['last'])), dtype=object)
+        lastInLink[candidates] = (contains(linkCompact, lastCompact[candidatePerson])
+                                  & (lastCompact[candidatePerson] != ''))
+    nameInTitle = firstInTitle & lastInTitle
+    firstOrLastInTitle = firstInTitle | lastInTitle
+
+    # Score term of the position of each result in its list
+    rank = numpy.arange(n) - numpy.searchsorted(rowPerson, rowPerson)
+
+    def scores(cls, *features):
+        # Same sum, in the same order, as score_result
+        featureScore = numpy.zeros(n)
+        for weight, feature in features:
+            featureScore = featureScore + numpy.where(feature, weight, 0.0)
+        return cls.SCORE_BASE + featureScore + cls.SCORE_RANK / (1 + rank)
+
+    linkedin = (handled['linkedin'] & nameInTitle
+                & ~contains(link, LinkedInResult.PUBLIC_PATH)
+                & companyInDescription)
+
+    researchgate = handled['researchgate'] & nameInTitle & researchgateProfile & lastInLink
+
+    linkExt = map(operator.itemgetter(slice(-4, None)), link)
+    isDocument = numpy.fromiter(map(DOCUMENT_EXTENSIONS.__contains__, linkExt), dtype=bool, count=n)
+    blocklist = PersonalPageResult.blocklist()
+    isBlocked = map_unique(df['domain'], lambda host: host in blocklist).astype(bool)
+
+    contactPage = numpy.fromiter(map(bool, map(CONTACT_PAGE_RE.match, titleLower)), dtype=bool, count=n)
+    sameDomain = (map_unique(df['domain'], registered_domain)
+                  == persons['emailRegisteredDomain'].to_numpy()[rowPerson]).astype(bool)
+
+    personal = (handled['personal'] & ~isDocument & ~isBlocked
+                & firstOrLastInTitle
+                & companyInDescription
+                & (contactPage | sameDomain | lastInLink))
+
+    return {
+        'linkedin': (linkedin, scores(
+            LinkedInResult,
+            (LinkedInResult.WEIGHT_PROFILE, profileLink),
+            (LinkedInResult.WEIGHT_LAST_IN_LINK, lastInLink))),
+        'personal': (personal, scores(
+            PersonalPageResult,
+            (PersonalPageResult.WEIGHT_CONTACT, contactPage),
+            (PersonalPageResult.WEIGHT_SAME_DOMAIN, sameDomain),
+            (PersonalPageResult.WEIGHT_LAST_IN_LINK, lastInLink))),
+        'researchgate': (researchgate, scores(
+            ResearchGateResult,
+            (ResearchGateResult.WEIGHT_COMPANY, companyInDescription)))
+    }
+
+
+def best_rows(rowPerson, n_persons, valid, score):
+    """Best scoring valid row of each person (the first one if tied), -1 if none"""
+    rows = numpy.flatnonzero(valid)
+    # Sort by person, then by decreasing score, then by row
+    rows = rows[numpy.lexsort((rows, -score[rows], rowPerson[rows]))]
+    first = numpy.ones(len(rows), dtype=bool)
+    first[1:] = rowPerson[rows[1:]] != rowPerson[rows[:-1]]
+
+    best = numpy.full(n_persons, -1)
+    best[rowPerson[rows[first]]] = rows[first]
+    return best
+
+
+def check_classifiers():
+    """Raise NotImplementedError if a classifier of parse.CLASSIFIERS is not implemented by validate"""
+    missing = [cls.key for cls in CLASSIFIERS if cls.key not in SITES]
+    if missing:
+        raise NotImplementedError('The pandas engine does not implement the classifiers {0}: '
+                                  'use the objects engine'.format(missing))
+
+
+def summarize(records, parse_mode, book):
+    """Return the list of summaries of (email, results) records, in order"""
+    records = list(records)
+    emails = [e for e, _ in records]
+    persons = persons_frame(emails, book)
+
+    # Columns of the summaries, one list of values per column
+    # (kept as lists: a DataFrame would turn missing links into NaN)
+    summaries = {
+        'email': emails,
+        'firstName': persons['first'].tolist(),
+        'lastName': persons['last'].tolist(),
+        'company': persons['company'].tolist()
+    }
+
+    if parse_mode == 'first':
+        # Nothing to compute: the first result of each record
+        summaries['firstGoogleResult'] = [results[0].link if results else None for _, results in records]
+        summaries['firstGoogleResultTitle'] = [results[0].name if results else None for _, results in records]
+    else:
+        check_classifiers()
+        df = results_frame(records)
+        valid = validate(df, persons) if len(df) else {}
+        links = df['link'].tolist()
+        for key in SITES:
+            if key in valid:
+                isValid, scores = valid[key]
+                best = best_rows(df['person'].to_numpy(), len(records), isValid, scores).tolist()
+                # Same as parse.confidence
+                confidence = [round(float(scores[row]), 3) if row >= 0 else None for row in best]
+            else:
+                best = [-1] * len(records)
+                confidence = [None] * len(records)
+            summaries[key + 'Certified'] = [row >= 0 for row in best]
+            summaries[key + 'Link'] = [links[row] if row >= 0 else None for row in best]
+            summaries[key + 'Confidence'] = confidence
+
+    columns = list(summaries)
+    return [dict(zip(columns, row)) for row in zip(*summaries.values())]
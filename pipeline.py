@@ -0,0 +1,119 @@
+"""
+Concurrent fetching of Google queries, and ordered parallel mapping.
+
+Queries are run by a pool of worker threads, while a single consumer (the caller)
+writes the results to the database.
+A RateLimiter shared by all workers caps the aggregate number of requests per second,
+whatever the number of workers.
+
+map_ordered runs CPU-bound work (e.g. parsing) in a process pool, keeping the input order.
+"""
+
+import collections
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class RateLimiter:
+    """Thread-safe token bucket.
+
+    Allows on average `rate` calls to acquire() per second, with bursts of at most `burst` calls.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def fetch_all(jobs, fetch, workers=1):
+    """Run fetch(argument) for every (key, argument) in jobs.
+
+    Yield (key, argument, result, error) as soon as each job finishes:
+    error is the exception raised by fetch, or None.
+    With workers > 1, jobs run in a thread pool with at most 2 * workers jobs in flight;
+    results are yielded in completion order. With workers == 1, jobs run in order in the caller's thread.
+    """
+    if workers <= 1:
+        for key, argument in jobs:
+            try:
+                yield key, argument, fetch(argument), None
+            except Exception as e:
+                yield key, argument, None, e
+        return
+
+    jobs = iter(jobs)
+    pending = {}
+
+    def submit(n):
+        for key, argument in itertools.islice(jobs, n):
+            pending[executor.submit(fetch, argument)] = (key, argument)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            submit(2 * workers)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, argument = pending.pop(future)
+                    error = future.exception()
+                    result = future.result() if error is None else None
+                    submit(1)
+                    yield key, argument, result, error
+        finally:
+            # Stop early (e.g. the consumer gave up): drop the jobs not started yet
+            for future in pending:
+                future.cancel()
+
+
+def chunked(items, size):
+    """Iterate over lists of at most size consecutive items"""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_ordered(executor, fn, items, max_pending):
+    """Yield fn(item) for every item, computed by the executor, in the order of items.
+
+    Unlike executor.map, items are consumed lazily: at most max_pending calls are in flight,
+    so memory stays bounded whatever the number of items.
+    """
+    items = iter(items)
+    pending = collections.deque()
+    try:
+        for item in itertools.islice(items, max_pending):
+            pending.append(executor.submit(fn, item))
+        while pending:
+            result = pending.popleft().result()
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield result
+    finally:
+        # Stop early (e.g. interrupt): drop the calls not started yet
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,132 @@
+"""
+Adaptive query plan for populate_database.
+
+Instead of running one query template for every email, templates are run in tiers
+(e.g. 'email' first, then 'name+surname+email'):
+the results of each query are classified straight away (parse.classify_Person),
+and the next template is only queried for the emails which are not certified yet.
+Results of successive queries are merged.
+
+The plan of each email (templates already run, certification) is stored with its results
+in the SQLite database (table plans), so that an interrupted run is resumed where it stopped.
+Records filled by ingest.populate_database store the template they ran as their plan:
+a template is never run twice for the same record.
+"""
+
+from ingest import load_address_book, normalize_email, make_query, group_queries, fetch_queries, merge_results, \
+    QUERY_TEMPLATES
+from store import ResultStore
+import parse
+
+
+# Query templates, in the order they are tried
+DEFAULT_TIERS = ['email', 'name+surname+email']
+
+
+def is_certified(email, results, book, targets=None):
+    """True if the results of an email are certified for every target site
+    (for at least one site if targets is None)"""
+    person = parse.PersonContext.from_book(email, book)
+    verdicts = parse.classify_Person(person, results)
+    if targets:
+        return all(verdicts[t].certified for t in targets)
+    return any(v.certified for v in verdicts.values())
+
+
+def certification_check(book, targets=None):
+    """Stop condition of multi-page queries: stop(email, results) is True once the results are certified.
+
+    Only reads the address book, so it can be called from the fetching threads."""
+    def stop(email, results):
+        return is_certified(email, results, book, targets)
+    return stop
+
+
+def next_tier(email, tried, tiers, book):
+    """Next query template to run for an email, None if all have been tried (or if the email is invalid).
+
+    Templates giving the same query string as a template already run are skipped."""
+    normalized = normalize_email(email)
+    if normalized is None:
+        return None
+    details = book.get(email)
+    ran = {make_query(normalized, details, t) for t in tried}
+    for tier in tiers:
+        if make_query(normalized, details, tier) not in ran:
+            return tier
+    return None
+
+
+def plan_database(db, tiers=DEFAULT_TIERS, targets=None, book=None, archive=None, workers=1, rate=None, pages=1,
+                  query='email'):
+    """Fill the database with Google queries, following the adaptive query plan.
+
+    tiers: query templates (see ingest.QUERY_TEMPLATES), in the order they are tried.
+    targets: sites (parse.CLASSIFIERS keys) which must be certified to stop querying an email,
+        default: any site.
+    pages: maximum number of pages of each query: the next page is only fetched
+        if the results of the query so far are not certified.
+    query: query template of the records filled before query plans were stored.
+    See ingest.populate_database for archive, workers and rate.
+    """
+    if not isinstance(db, ResultStore):
+        raise ValueError('The query plan is stored in SQLite databases only: run migrate_database first')
+    for tier in list(tiers) + [query]:
+        if tier not in QUERY_TEMPLATES:
+            raise ValueError('query must be in {0}'.format(list(QUERY_TEMPLATES.keys())))
+    if book is None:
+        book = load_address_book()
+
+    plans = db.plans()
+
+    # Records filled by populate_database (with the template `query` if their plan was not stored):
+    # their certification is checked with the current targets
+    for email, results in db.items_queried():
+        tried, certified = plans.get(email, ([query], False))
+        if not certified and next_tier(email, tried, tiers, book) is not None:
+            certified = is_certified(email, results, book, targets)
+        if plans.get(email) != (tried, certified):
+            plans[email] = (tried, certified)
+            db.set_plan(email, tried, certified)
+    for email in db.emails_not_queried():
+        if isinstance(email, str) and email not in plans:
+            plans[email] = ([], False)
+
+    stop = certification_check(book, targets) if pages > 1 else None
+
+    pending = [e for e, (tried, certified) in plans.items()
+               if not certified and e in db and next_tier(e, tried, tiers, book) is not None]
+    print('Query plan: {0} of {1} records to query.'.format(len(pending), len(db)))
+
+    n_requests = 0
+    n_certified = 0
+    while pending:
+        # One pass per tier: the emails which are still not certified get their next template
+        queries = {e: next_tier(e, plans[e][0], tiers, book) for e in pending}
+        # Identical queries are fetched once
+        groups = group_queries(((e, queries[e]) for e in pending), book)
+        jobs = ((emails[0], query_string) for query_string, emails in groups.items())
+
+        fallback = []
+        for _, query_string, result, n_pages in fetch_queries(jobs, len(groups), archive=archive,
+                                                              workers=workers, rate=rate, pages=pages, stop=stop):
+            # Every page is a request
+            n_requests += n_pages
+            for email in groups[query_string]:
+                tried = plans[email][0] + [queries[email]]
+                results = merge_results(db[email], result)
+                certified = is_certified(email, results, book, targets)
+                plans[email] = (tried, certified)
+
+                # Results and plan are stored together
+                db.set_plan(email, tried, certified, results=results)
+
+                if certified:
+                    n_certified += 1
+                    print('Certified after {0} queries.'.format(len(tried)))
+                elif next_tier(email, tried, tiers, book) is not None:
+                    fallback.append(email)
+
+        pending = fallback
+
+    print('Finished query plan: {0} requests, {1} records certified.'.format(n_requests, n_certified))
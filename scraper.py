@@ -1,7 +1,10 @@
 import click
 import ingest
 import parse
+import export
 import os
+import planner
+from archive import HtmlArchive
 
 @click.group()
 def cli():
@@ -27,19 +30,50 @@ def make_new_database(test):
 @click.command()
 @click.option('--query', default='name+surname+email',
     type=click.Choice(['email', 'name+surname+email']),
-    help='Google query to use')
-@click.option('--write', default=True, help='update database at each query')
-def populate_database(query, write):
+    help='Google query to use (with --plan: the query of the records populated before query plans were stored)')
+@click.option('--write', default=True, help='update database at each query (False: once at the end)')
+@click.option('--archive/--no-archive', default=True, help='keep the raw html of every page in archive.sqlite')
+@click.option('--workers', default=1, type=click.IntRange(min=1), help='number of concurrent queries')
+@click.option('--rate', default=1.0, type=click.FloatRange(min=0, min_open=True),
+    help='maximum number of Google requests per second (all workers together)')
+@click.option('--plan', default=None,
+    help='adaptive plan: comma-separated queries tried in turn until certification (e.g. email,name+surname+email)')
+@click.option('--max-pages', default=1, type=click.IntRange(min=1),
+    help='fetch up to N pages of each query, stopping as soon as the results are certified')
+@click.option('--target', 'targets', multiple=True, type=click.Choice([c.key for c in parse.CLASSIFIERS]),
+    help='with --plan or --max-pages: site which must be certified to stop querying a record '
+         '(repeatable, default: any site)')
+def populate_database(query, write, archive, workers, rate, plan, max_pages, targets):
     """Populate the database by making Google queries. Details are not filled yet.
     """
     db = ingest.load_database()
-    db = ingest.populate_database(db, query=query, write=write)
+    book = ingest.load_address_book()
+    html_archive = HtmlArchive() if archive else None
+    if plan:
+        planner.plan_database(db, tiers=plan.split(','), targets=list(targets) or None, book=book,
+                              archive=html_archive, workers=workers, rate=rate, pages=max_pages,
+                              query=query)
+        return
+    stop = planner.certification_check(book, list(targets) or None) if max_pages > 1 else None
+    db = ingest.populate_database(db, query=query, write=write, book=book, archive=html_archive,
+                                  workers=workers, rate=rate, pages=max_pages, stop=stop)
+
+
+@click.command()
+@click.option('--query', default='name+surname+email',
+    type=click.Choice(['email', 'name+surname+email']),
+    help='Google query used to populate the database (records with a query plan use the queries they ran)')
+def reparse(query):
+    """Rebuild the database from the html archive, without querying Google."""
+    db = ingest.load_database()
+    book = ingest.load_address_book()
+    ingest.reparse_database(db, HtmlArchive(), query=query, book=book)
 
 
 @click.command()
 def stats():
     """Show statistics from the saved database."""
-    db = ingest.load_database()
+    db = ingest.load_database(readonly=True)
     ingest.database_stats(db)
 
 
@@ -47,28 +81,66 @@ def stats():
 @click.option('--policy', default='first',
     type=click.Choice(['first', 'advanced']),
     help='policy to extract information')
-def parse_information(policy):
+@click.option('--format', 'file_format', default='csv',
+    type=click.Choice(['csv'] + export.FORMATS),
+    help='output format (results.csv, results.parquet or results.feather)')
+@click.option('--batch-size', default=1000, type=click.IntRange(min=1),
+    help='records written to results.csv between checkpoints')
+@click.option('--resume/--no-resume', default=False,
+    help='continue an interrupted run from its checkpoint')
+@click.option('--workers', default=1, type=click.IntRange(min=1),
+    help='number of processes classifying results in parallel')
+@click.option('--incremental/--full', default=False,
+    help='parse again only the records which changed since the previous export')
+@click.option('--engine', default='objects', type=click.Choice(parse.ENGINES),
+    help='classify with one object per person, or with vectorized pandas operations')
+def parse_information(policy, file_format, batch_size, resume, workers, incremental, engine):
     """Extract information from Google results in the database."""
     """
     Load the database with stored Google results.
     Parse each result and instantiate corresponding objects.
-    Export at the end.
+    Export results.csv in batches (checkpointed), or a columnar file at the end.
     """
 
-    db = ingest.load_database()
-    parse.parseResults(db, policy)
+    db = ingest.load_database(readonly=True)
+    book = ingest.load_address_book()
+    parse.parseResults(db, policy, book=book, file_format=file_format,
+        batch_size=batch_size, resume=resume, workers=workers, incremental=incremental,
+        engine=engine)
+
+
+@click.command()
+@click.option('--format', 'file_format', default='parquet',
+    type=click.Choice(export.FORMATS),
+    help='columnar output format')
+def export_results(file_format):
+    """Export all stored Google results to google_results.parquet (or .feather)."""
+    db = ingest.load_database(readonly=True)
+    export.export_results(db, 'google_results.' + file_format, file_format)
+
+
+@click.command()
+@click.option('--pickle-path', default='database.pickle', help='pickled database to import')
+def migrate_database(pickle_path):
+    """Import a pickled database into the SQLite database."""
+    ingest.migrate_database(pickle_path, ingest.DEFAULT_DB_PATH)
 
 
 @click.command()
 def drop_database():
     """Clear the database from disk."""
-    os.remove('database.pickle')
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(ingest.DEFAULT_DB_PATH + suffix):
+            os.remove(ingest.DEFAULT_DB_PATH + suffix)
 
 
 cli.add_command(make_new_database)
 cli.add_command(populate_database)
+cli.add_command(reparse)
 cli.add_command(stats)
 cli.add_command(parse_information)
+cli.add_command(export_results)
+cli.add_command(migrate_database)
 cli.add_command(drop_database)
 
 
@@ -0,0 +1,270 @@
+"""
+SQLite storage for the database of Google results.
+
+A ResultStore behaves like the Dict database (email as the key, list of GoogleResult as value),
+but it is kept on disk in a single SQLite file:
+- table records: one row per email, with a flag telling whether the email has been queried,
+- table results: one row per GoogleResult, indexed by email and position in the result list,
+- table plans: the query plan of each email (query templates already run, certification), see planner.py.
+
+Assigning a list of GoogleResult to an email is a single transaction:
+only that record is rewritten, and an interrupted run never corrupts the stored ones.
+
+Nothing is loaded until it is accessed: len(), iteration over emails, membership tests
+and counters are answered by SQL queries on the indexes, and results are only built
+into GoogleResult objects when a record is read.
+
+An existing database.pickle can be imported once with migrate_pickle.
+"""
+
+import os
+import pickle
+import sqlite3
+import urllib.parse
+from collections.abc import MutableMapping
+
+from google.modules.standard_search import GoogleResult
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    email TEXT PRIMARY KEY,
+    queried INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS records_queried ON records (queried);
+
+CREATE TABLE IF NOT EXISTS results (
+    email TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    page INTEGER,
+    idx INTEGER,
+    name TEXT,
+    link TEXT,
+    google_link TEXT,
+    description TEXT,
+    thumb TEXT,
+    cached TEXT,
+    PRIMARY KEY (email, position)
+);
+CREATE INDEX IF NOT EXISTS results_link ON results (link);
+
+CREATE TABLE IF NOT EXISTS plans (
+    email TEXT PRIMARY KEY,
+    tried TEXT NOT NULL DEFAULT '',
+    certified INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns of table results which map to GoogleResult attributes
+RESULT_COLUMNS = ['page', 'idx', 'name', 'link', 'google_link', 'description', 'thumb', 'cached']
+RESULT_ATTRIBUTES = ['page', 'index', 'name', 'link', 'google_link', 'description', 'thumb', 'cached']
+
+
+def is_pickle_path(db_path):
+    """True if the database path points to a pickled Dict instead of a SQLite store"""
+    return os.path.splitext(db_path)[1] in ('.pickle', '.pkl')
+
+
+def result_to_row(email, position, result):
+    """Convert a GoogleResult to a row of table results"""
+    return (email, position) + tuple(getattr(result, a, None) for a in RESULT_ATTRIBUTES)
+
+
+def row_to_result(row):
+    """Convert a row of table results (without email and position) to a GoogleResult"""
+    result = GoogleResult()
+    for attribute, value in zip(RESULT_ATTRIBUTES, row):
+        setattr(result, attribute, value)
+    return result
+
+
+class ResultStore(MutableMapping):
+    """Database of Google results stored in a SQLite file.
+
+    Keys are emails, values are lists of GoogleResult (None if the email has not been queried yet).
+    Every assignment is committed immediately, in its own transaction.
+
+    With readonly=True the file is opened read-only and memory-mapped:
+    this is the cheap way to inspect or parse a database.
+    """
+
+    # Bytes of the database file mapped in memory
+    MMAP_SIZE = 2 ** 30
+
+    def __init__(self, db_path='database.sqlite', readonly=False):
+        self.db_path = db_path
+        self.readonly = readonly
+
+        if readonly:
+            uri = 'file:{0}?mode=ro'.format(urllib.parse.quote(os.path.abspath(db_path)))
+            self._conn = sqlite3.connect(uri, uri=True)
+        else:
+            self._conn = sqlite3.connect(db_path)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        self._conn.execute('PRAGMA mmap_size={0}'.format(self.MMAP_SIZE))
+
+    def __getitem__(self, email):
+        row = self._conn.execute(
+            'SELECT queried FROM records WHERE email = ?', (email,)).fetchone()
+        if row is None:
+            raise KeyError(email)
+        if not row[0]:
+            return None
+
+        rows = self._conn.execute(
+            'SELECT {0} FROM results WHERE email = ? ORDER BY position'.format(', '.join(RESULT_COLUMNS)),
+            (email,))
+        return [row_to_result(r) for r in rows]
+
+    def __setitem__(self, email, results):
+        with self._conn:
+            self._write_record(email, results)
+
+    def __delitem__(self, email):
+        with self._conn:
+            cur = self._conn.execute('DELETE FROM records WHERE email = ?', (email,))
+            if cur.rowcount == 0:
+                raise KeyError(email)
+            self._conn.execute('DELETE FROM results WHERE email = ?', (email,))
+            self._conn.execute('DELETE FROM plans WHERE email = ?', (email,))
+
+    def __contains__(self, email):
+        row = self._conn.execute(
+            'SELECT 1 FROM records WHERE email = ?', (email,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        # Records are returned in insertion order, as in a Dict
+        for (email,) in self._conn.execute('SELECT email FROM records ORDER BY rowid'):
+            yield email
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def count_queried(self):
+        """Number of emails with stored results (non-null entries)"""
+        return self._conn.execute('SELECT COUNT(*) FROM records WHERE queried = 1').fetchone()[0]
+
+    def emails_not_queried(self):
+        """List the emails without stored results, in insertion order"""
+        rows = self._conn.execute('SELECT email FROM records WHERE queried = 0 ORDER BY rowid')
+        return [r[0] for r in rows]
+
+    def count_results(self):
+        """Number of stored GoogleResults"""
+        return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def items_queried(self):
+        """Iterate over (email, list of GoogleResult) of queried emails, in insertion order.
+
+        Results are read with a single query and built one record at a time.
+        """
+        rows = self._conn.execute(
+            'SELECT records.email, results.position, {0} '
+            'FROM records LEFT JOIN results ON results.email = records.email '
+            'WHERE records.queried = 1 ORDER BY records.rowid, results.position'.format(
+                ', '.join('results.' + c for c in RESULT_COLUMNS)))
+
+        email, results = None, None
+        for row in rows:
+            if row[0] != email:
+                if results is not None:
+                    yield email, results
+                email, results = row[0], []
+            # A queried email may have no results at all
+            if row[1] is not None:
+                results.append(row_to_result(row[2:]))
+        if results is not None:
+            yield email, results
+
+    def _write_record(self, email, results):
+        """Upsert a record and its results (inside an open transaction)"""
+        self._conn.execute(
+            'INSERT INTO records (email, queried) VALUES (?, ?) '
+            'ON CONFLICT (email) DO UPDATE SET queried = excluded.queried',
+            (email, int(results is not None)))
+        self._conn.execute('DELETE FROM results WHERE email = ?', (email,))
+
+        if results is not None:
+            self._conn.executemany(
+                'INSERT INTO results VALUES ({0})'.format(', '.join(['?'] * (len(RESULT_COLUMNS) + 2))),
+                (result_to_row(email, i, r) for i, r in enumerate(results)))
+
+    def plans(self):
+        """Return the query plans of all emails: Dict email -> (list of query templates run, certified)"""
+        rows = self._conn.execute('SELECT email, tried, certified FROM plans')
+        return {email: (tried.split(',') if tried else [], bool(certified)) for email, tried, certified in rows}
+
+    def _write_plan(self, email, tried, certified):
+        """Upsert the query plan of an email (inside an open transaction)"""
+        self._conn.execute(
+            'INSERT INTO plans (email, tried, certified) VALUES (?, ?, ?) '
+            'ON CONFLICT (email) DO UPDATE SET tried = excluded.tried, certified = excluded.certified',
+            (email, ','.join(tried), int(certified)))
+
+    def set_plan(self, email, tried, certified, results=None):
+        """Store the query plan of an email (and its new results if given), in a single transaction"""
+        with self._conn:
+            if results is not None:
+                self._write_record(email, results)
+            self._write_plan(email, tried, certified)
+
+    def update_many(self, db, tried=None):
+        """Upsert all records of a Dict database in a single transaction.
+
+        If given, tried (list of query templates) is stored as the query plan of every record, not certified."""
+        with self._conn:
+            for email, results in db.items():
+                self._write_record(email, results)
+                if tried is not None:
+                    self._write_plan(email, tried, False)
+
+    def replace_all(self, db):
+        """Replace the whole content of the store with a Dict database, in a single transaction"""
+        with self._conn:
+            self._conn.execute('DELETE FROM results')
+            self._conn.execute('DELETE FROM records')
+            self._conn.execute('DELETE FROM plans')
+            for email, results in db.items():
+                self._write_record(email, results)
+
+    def commit(self):
+        """Flush pending changes (assignments are already committed)"""
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def items_queried(db):
+    """Iterate over (email, list of GoogleResult) of queried emails of any database"""
+    if isinstance(db, ResultStore):
+        return db.items_queried()
+    return ((e, r) for e, r in db.items() if r is not None)
+
+
+def emails_not_queried(db):
+    """List the emails without stored results (null entries) of any database"""
+    if isinstance(db, ResultStore):
+        return db.emails_not_queried()
+    return [e for e, r in db.items() if r is None]
+
+
+def count_queried(db):
+    """Number of queried emails (non-null entries) of any database"""
+    if isinstance(db, ResultStore):
+        return db.count_queried()
+    return sum(1 for r in db.values() if r is not None)
+
+
+def migrate_pickle(pickle_path='database.pickle', db_path='database.sqlite'):
+    """Import a pickled Dict database into a SQLite store, in a single transaction"""
+    with open(pickle_path, 'rb') as f:
+        db = pickle.load(f)
+
+    store = ResultStore(db_path)
+    store.update_many(db)
+    print("Migrated {0} entries from {1} to {2}.".format(len(db), pickle_path, db_path))
+    return store
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import export
+import parse
+from tests.test_parse_batch import make_records
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.book, records = make_records(50)
+        self.db = dict(records)
+
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def parse(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            parse.parseResults(self.db, 'advanced', book=self.book, batch_size=8, **kwargs)
+        with open('results.csv', 'rb') as f:
+            return f.read()
+
+    def test_interrupt_record(self):
+        """Test that a run interrupted in the middle of a batch is resumed to the same results.csv"""
+        expected = self.parse()
+
+        parseAdvanced = parse.parseAdvanced
+        calls = []
+
+        def interrupted(person, results):
+            calls.append(person.email)
+            if len(calls) == 21:
+                raise KeyboardInterrupt()
+            return parseAdvanced(person, results)
+
+        with mock.patch.object(parse, 'parseAdvanced', interrupted):
+            partial = self.parse()
+        self.assertTrue(os.path.exists('results.csv.checkpoint'))
+        self.assertTrue(expected.startswith(partial))
+        self.assertLess(len(partial), len(expected))
+
+        self.assertEqual(self.parse(resume=True), expected)
+        self.assertFalse(os.path.exists('results.csv.checkpoint'))
+
+    def test_interrupt_write(self):
+        """Test that a run interrupted while writing a batch is resumed to the same results.csv"""
+        expected = self.parse()
+
+        to_csv = export.pandas.DataFrame.to_csv
+        calls = []
+
+        def interrupted(df, f, **kwargs):
+            calls.append(len(df))
+            if len(calls) == 3:
+                # Part of the batch reaches the file
+                f.write(df.to_string()[:100])
+                raise KeyboardInterrupt()
+            return to_csv(df, f, **kwargs)
+
+        with mock.patch.object(export.pandas.DataFrame, 'to_csv', interrupted):
+            partial = self.parse()
+        self.assertTrue(os.path.exists('results.csv.checkpoint'))
+        self.assertTrue(expected.startswith(partial))
+
+        self.assertEqual(self.parse(resume=True), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
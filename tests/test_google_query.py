@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from google.modules import standard_search
+
+import google_query
+
+
+RESULT = ('<html><body><div id="ires"><div class="g"><h3 class="r">'
+          '<a href="/url?q=http://{0}.com/&amp;sa=U">Result {0}</a></h3>'
+          '<div class="s"><span class="st">About {0}</span></div></div></div></body></html>')
+
+
+class GoogleQueryTest(unittest.TestCase):
+
+    def query_pages(self, html, pages=5, stop=None):
+        limiter = mock.Mock()
+        with mock.patch.object(standard_search, 'get_html', mock.Mock(side_effect=html)) as get_html:
+            results, n_pages = google_query.do_google_query_pages('query', pages=pages, stop=stop, limiter=limiter)
+        self.assertEqual(get_html.call_count, n_pages)
+        self.assertEqual(limiter.acquire.call_count, n_pages)
+        return results, n_pages
+
+    def test_pages(self):
+        """Test that every page is counted until the last one asked for"""
+        html = [RESULT.format(n).encode('utf-8') for n in range(3)]
+        results, n_pages = self.query_pages(html, pages=3, stop=lambda results: False)
+        self.assertEqual([r.link for r in results], ['http://0.com/', 'http://1.com/', 'http://2.com/'])
+        self.assertEqual(n_pages, 3)
+
+    def test_stop(self):
+        """Test that no page is requested once the stop condition is true"""
+        html = [RESULT.format(n).encode('utf-8') for n in range(3)]
+        results, n_pages = self.query_pages(html, stop=lambda results: len(results) >= 2)
+        self.assertEqual(n_pages, 2)
+
+    def test_end_of_results(self):
+        """Test that no page is requested after a page without results"""
+        results, n_pages = self.query_pages([None] * 5, stop=lambda results: False)
+        self.assertEqual((results, n_pages), ([], 1))
+
+        html = [RESULT.format(0).encode('utf-8'), b'<html><body></body></html>', RESULT.format(2).encode('utf-8')]
+        results, n_pages = self.query_pages(html, stop=lambda results: False)
+        self.assertEqual([r.link for r in results], ['http://0.com/'])
+        self.assertEqual(n_pages, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
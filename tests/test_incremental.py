@@ -0,0 +1,91 @@
+import contextlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from google.modules.standard_search import GoogleResult
+
+import parse
+from tests.test_parse_batch import make_records
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.book, records = make_records(40)
+        self.db = dict(records)
+
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def parse(self, **kwargs):
+        """Run parseResults, return (results.csv, emails of the records parsed)"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            parse.parseResults(self.db, 'advanced', book=self.book, batch_size=8, **kwargs)
+        with open('results.csv', 'rb') as f:
+            # parseAdvanced prints '*** first last @ company - email ***' for each record
+            parsed = re.findall(r'^\*\*\* .* - (\S+) \*\*\*$', output.getvalue(), re.MULTILINE)
+            return f.read(), parsed
+
+    def change_record(self, email):
+        """Add a result to a record"""
+        result = GoogleResult()
+        result.name = 'New result'
+        result.link = 'https://example.org/new'
+        result.description = 'nothing'
+        self.db[email] = self.db[email] + [result]
+
+    def test_incremental(self):
+        """Test that only a changed record is parsed again, with the same output as a full run"""
+        email = list(self.db)[17]
+
+        for workers in [1, 3]:
+            _, parsed = self.parse(workers=workers)
+            self.assertEqual(parsed, list(self.db))
+
+            _, parsed = self.parse(workers=workers, incremental=True)
+            self.assertEqual(parsed, [])
+
+            self.change_record(email)
+            output, parsed = self.parse(workers=workers, incremental=True)
+            self.assertEqual(parsed, [email])
+
+            expected, _ = self.parse(workers=workers)
+            self.assertEqual(output, expected)
+
+    def test_incremental_after_resume(self):
+        """Test that the records of an interrupted run are not parsed again after it is resumed"""
+        parseAdvanced = parse.parseAdvanced
+        calls = []
+
+        def interrupted(person, results):
+            calls.append(person.email)
+            if len(calls) == 21:
+                raise KeyboardInterrupt()
+            return parseAdvanced(person, results)
+
+        with mock.patch.object(parse, 'parseAdvanced', interrupted):
+            self.parse()
+        self.parse(resume=True)
+
+        email = list(self.db)[3]
+        self.change_record(email)
+        output, parsed = self.parse(incremental=True)
+        self.assertEqual(parsed, [email])
+
+        expected, _ = self.parse()
+        self.assertEqual(output, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas
+
+from google.modules.standard_search import GoogleResult
+
+import ingest
+from store import ResultStore
+
+
+def make_book():
+    rows = [
+        {"Country": "X", "CompanyName": "Acme", "FirstName": "Anna", "LastName": "Smith",
+         "EmailAddress": " Anna.Smith@Acme.COM"},
+        {"Country": "X", "CompanyName": "Acme", "FirstName": "John", "LastName": "Doe",
+         "EmailAddress": "john@acme.com"},
+        {"Country": "X", "CompanyName": "Acme", "FirstName": "Bad", "LastName": "Email",
+         "EmailAddress": "not an email"}
+    ]
+    return ingest.AddressBook(pandas.DataFrame(rows))
+
+
+class FakeArchive:
+    """Archive of one page per query, whose html is the link of its only result"""
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def latest(self, query):
+        if query in self.queries:
+            return [(0, query)]
+        return []
+
+
+def parse_google_pages(pages):
+    results = []
+    for _, html in pages:
+        r = GoogleResult()
+        r.link = html
+        results.append(r)
+    return results
+
+
+class IngestTest(unittest.TestCase):
+
+    def test_normalize_email(self):
+        """Test that emails are stripped and lowercased, and that invalid ones are rejected"""
+        self.assertEqual(ingest.normalize_email(' Anna.Smith@Acme.COM\t'), 'anna.smith@acme.com')
+        self.assertEqual(ingest.normalize_email('john@mail.acme.co.uk'), 'john@mail.acme.co.uk')
+        for email in ['', 'not an email', 'john@acme', 'john@@acme.com', 'jo hn@acme.com', 'john@acme.', None, 12]:
+            self.assertIsNone(ingest.normalize_email(email))
+
+    def test_address_book(self):
+        """Test that the address book is looked up with any variant of an email"""
+        book = make_book()
+        for email in ['anna.smith@acme.com', 'ANNA.SMITH@ACME.COM ', ' Anna.Smith@Acme.COM']:
+            self.assertIn(email, book)
+            self.assertEqual(book.get(email)['first'], 'Anna')
+        self.assertEqual(book.get('not an email')['first'], 'Bad')
+
+    def test_make_new_database(self):
+        """Test that the new database holds normalized emails, without duplicates nor invalid addresses"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'addresses.csv')
+        with open(path, 'w') as f:
+            f.write('Country;CompanyName;FirstName;LastName;Title;EmailAddress\n'
+                    'X;Acme;Anna;Smith;Dr.; Anna.Smith@Acme.COM\n'
+                    'X;Acme;Anna;Smith;Dr.;anna.smith@acme.com\n'
+                    'X;Acme;Bad;Email;Dr.;not an email\n'
+                    'X;Acme;John;Doe;Mr.;john@acme.com\n')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = ingest.make_new_database(path)
+        self.assertEqual(db, {'anna.smith@acme.com': None, 'john@acme.com': None})
+
+    def test_group_queries(self):
+        """Test that invalid emails are skipped and that each distinct query is fetched once for every record"""
+        book = make_book()
+        jobs = [(' Anna.Smith@Acme.COM', 'email'), ('anna.smith@acme.com', 'email'), ('not an email', 'email'),
+                ('ANNA.SMITH@acme.com', 'name+surname+email'), ('john@acme.com', 'email')]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            groups = ingest.group_queries(jobs, book)
+        self.assertEqual(groups, {
+            'anna.smith@acme.com': [' Anna.Smith@Acme.COM', 'anna.smith@acme.com'],
+            'Anna Smith "anna.smith@acme.com"': ['ANNA.SMITH@acme.com'],
+            'john@acme.com': ['john@acme.com']
+        })
+
+    def populate(self, db, write=True, db_path=ingest.DEFAULT_DB_PATH):
+        """Run populate_database on the records of make_book, return the queries and the number of
+        records stored before each query"""
+        queries = []
+        stored = []
+
+        def do_google_query_pages(query, archive=None, pages=1, stop=None, limiter=None):
+            queries.append(query)
+            stored.append(ingest.count_queried(db))
+            return parse_google_pages([(0, query)]), 1
+
+        with mock.patch.object(ingest, 'do_google_query_pages', do_google_query_pages):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ingest.populate_database(db, query='email', write=write, book=make_book(), db_path=db_path)
+        return queries, stored
+
+    def test_populate_database(self):
+        """Test that the results of a query are stored for every record with the same query"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        db_path = os.path.join(directory, 'database.pickle')
+
+        db = {' Anna.Smith@Acme.COM': None, 'anna.smith@acme.com': None, 'not an email': None,
+              'john@acme.com': None}
+        queries, _ = self.populate(db, write=False, db_path=db_path)
+        self.assertEqual(queries, ['anna.smith@acme.com', 'john@acme.com'])
+        expected = {
+            ' Anna.Smith@Acme.COM': ['anna.smith@acme.com'],
+            'anna.smith@acme.com': ['anna.smith@acme.com'],
+            'not an email': None,
+            'john@acme.com': ['john@acme.com']
+        }
+        self.assertEqual({e: [r.link for r in results] if results is not None else None
+                          for e, results in db.items()}, expected)
+
+        # Written once at the end
+        with contextlib.redirect_stdout(io.StringIO()):
+            saved = ingest.load_database(db_path)
+        self.assertEqual({e: [r.link for r in results] if results is not None else None
+                          for e, results in saved.items()}, expected)
+
+    def test_populate_write(self):
+        """Test that records are stored after each query, or all at once at the end if write is False"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        for write, stored in [(True, [0, 1]), (False, [0, 0])]:
+            db = ResultStore(os.path.join(directory, '{0}.sqlite'.format(write)))
+            self.addCleanup(db.close)
+            for email in ['anna.smith@acme.com', 'not an email', 'john@acme.com']:
+                db[email] = None
+
+            self.assertEqual(self.populate(db, write=write), (['anna.smith@acme.com', 'john@acme.com'], stored))
+            self.assertEqual(db.count_queried(), 2)
+            self.assertEqual(db.plans(), {'anna.smith@acme.com': (['email'], False),
+                                          'john@acme.com': (['email'], False)})
+
+    def test_reparse_database(self):
+        """Test that records are found in the archive by their normalized email, and that invalid ones are skipped"""
+        book = make_book()
+        db = {' Anna.Smith@Acme.COM': None, 'not an email': [], 'john@acme.com': None}
+        archive = FakeArchive(['anna.smith@acme.com', 'not an email'])
+
+        with mock.patch.object(ingest, 'parse_google_pages', parse_google_pages):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ingest.reparse_database(db, archive, query='email', book=book)
+        self.assertEqual([r.link for r in db[' Anna.Smith@Acme.COM']], ['anna.smith@acme.com'])
+        self.assertEqual(db['not an email'], [])
+        self.assertIsNone(db['john@acme.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from names import NameMatcher, compact_link, name_variants, title_tokens
+
+
+class NamesTest(unittest.TestCase):
+
+    def test_title_tokens(self):
+        """Test that titles are transliterated, casefolded and split into alphanumeric tokens"""
+        self.assertEqual(title_tokens('José DE-LUCA | LinkedIn'), {'jose', 'de', 'luca', 'linkedin'})
+        self.assertEqual(title_tokens('Müller · Straße, O\'Brien'), {'muller', 'strasse', 'o', 'brien'})
+        self.assertEqual(title_tokens(''), frozenset())
+        self.assertEqual(title_tokens(None), frozenset())
+
+    def test_name_variants(self):
+        """Test that compound names also match joined, and that blank names have no variants"""
+        self.assertEqual(name_variants('Smith'), (frozenset(['smith']),))
+        self.assertEqual(name_variants('De Luca'), (frozenset(['de', 'luca']), frozenset(['deluca'])))
+        self.assertEqual(name_variants(''), ())
+        self.assertEqual(name_variants(' - '), ())
+
+    def test_matcher(self):
+        """Test matching first and last names in titles, ignoring case, accents and separators"""
+        names = NameMatcher('José', 'De Luca')
+        self.assertTrue(names.full_in(title_tokens('Jose de Luca - Acme')))
+        self.assertTrue(names.full_in(title_tokens('DELUCA, JOSÉ')))
+        self.assertTrue(names.full_in(title_tokens('José De-Luca')))
+        self.assertFalse(names.full_in(title_tokens('José Luca')))
+        self.assertTrue(names.first_in(title_tokens('José Luca')))
+        self.assertFalse(names.last_in(title_tokens('José Luca')))
+
+        # Whole tokens only
+        names = NameMatcher('Li', 'Wang')
+        self.assertFalse(names.first_in(title_tokens('Lisa Wangler')))
+        self.assertFalse(names.last_in(title_tokens('Lisa Wangler')))
+
+    def test_blank_names(self):
+        """Test that blank names are never found"""
+        names = NameMatcher('', 'Smith')
+        tokens = title_tokens('Acme contact page')
+        self.assertFalse(names.first_in(tokens))
+        self.assertFalse(names.first_in(frozenset()))
+        self.assertFalse(names.full_in(title_tokens('Smith')))
+        self.assertTrue(names.last_in(title_tokens('John Smith')))
+
+        names = NameMatcher('John', '')
+        self.assertFalse(names.last_in(tokens))
+        self.assertFalse(names.last_in_link('https://acme.com/contact'))
+
+    def test_last_in_link(self):
+        """Test matching the last name in links, with escapes and separators"""
+        self.assertEqual(compact_link('https://www.x.com/Jose-De-Luca'), 'httpswwwxcomjosedeluca')
+
+        names = NameMatcher('José', 'Ñúñez De Luca')
+        self.assertTrue(names.last_in_link('https://www.linkedin.com/in/nunez-de-luca-1234'))
+        self.assertTrue(names.last_in_link('https://acme.com/people/%C3%91%C3%BA%C3%B1ez_De_Luca'))
+        self.assertTrue(names.last_in_link('https://acme.com/NUNEZDELUCA.html'))
+        self.assertFalse(names.last_in_link('https://acme.com/nunez'))
+        self.assertFalse(names.last_in_link(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+from builtins import range
+import contextlib
+import io
+import random
+import unittest
+import urllib.parse
+from unittest import mock
+
+import pandas
+
+import ingest
+import parse
+import parse_batch
+from google.modules.standard_search import GoogleResult
+
+
+FIRST_NAMES = ["John", "José", "Anna", "Jean-Luc", "Li", "Zoë", ""]
+LAST_NAMES = ["Smith", "De Luca", "Müller", "O'Brien", "Wang", "Ñúñez", ""]
+COMPANIES = ["Acme", "Globex Corp", "Initech", ""]
+EMAIL_DOMAINS = ["acme.com", "mail.globex.co.uk", "initech.com", "gmail.com"]
+HOSTS = ["www.linkedin.com", "ch.linkedin.com", "www.researchgate.net", "www.facebook.com",
+         "acme.com", "www.globex.co.uk", "example.org", "initech.com"]
+
+
+def make_records(n_persons, seed=0):
+    """Random address book and (email, results) records, covering the cases of the classifiers."""
+    rng = random.Random(seed)
+    rows = []
+    records = []
+    for i in range(n_persons):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        company = rng.choice(COMPANIES)
+        email = "p{0}@{1}".format(i, rng.choice(EMAIL_DOMAINS))
+        rows.append({"Country": "X", "CompanyName": company, "FirstName": first,
+                     "LastName": last, "EmailAddress": email})
+
+        last_variants = [last, last.upper(), last.replace(" ", ""), last.replace(" ", "-").lower(),
+                         "Nunez", urllib.parse.quote(last), "Jos%C3%A9-" + last.replace(" ", "_")]
+        results = []
+        for j in range(rng.randint(1, 8)):
+            r = GoogleResult()
+            path = rng.choice(["/in/", "/pub/", "/profile/", "/", "/contact/", "/files/"])
+            r.link = "https://{0}{1}{2}{3}".format(
+                rng.choice(HOSTS), path, rng.choice(last_variants), rng.choice(["", ".pdf", ".html", "/"]))
+            r.name = rng.choice([
+                "{0} {1} | LinkedIn".format(first, last),
+                "{0} {1}".format(last.upper(), first),
+                "{0}{1} – profile".format(first, last.replace(" ", "")),
+                "Jose Nunez · Zoe",
+                "Contact {0}".format(last),
+                "Kontakt",
+                "Something else"])
+            r.description = rng.choice([
+                "{0} {1} at {2}".format(first, last, company.upper()),
+                "Works at {0}".format(company),
+                "Line\nbreak at {0}".format(company),
+                "nothing"])
+            r.page = 0
+            r.index = j
+            results.append(r)
+        records.append((email, results))
+    return ingest.AddressBook(pandas.DataFrame(rows)), records
+
+
+class ParseBatchTest(unittest.TestCase):
+
+    def summaries(self, records, book, parse_mode, engine):
+        parser = {"first": parse.parseFirstResult, "advanced": parse.parseAdvanced}[parse_mode]
+        with contextlib.redirect_stdout(io.StringIO()):
+            return list(parse.iter_summaries(records, parser, book, chunk_size=37,
+                                             engine=engine, parse_mode=parse_mode))
+
+    def test_engines_equal(self):
+        """Test that the pandas engine gives the same summaries as the classifier objects."""
+
+        book, records = make_records(400)
+        for parse_mode in ["first", "advanced"]:
+            objects = self.summaries(records, book, parse_mode, "objects")
+            batch = self.summaries(records, book, parse_mode, "pandas")
+            self.assertEqual(len(batch), len(records))
+            for expected, summary in zip(objects, batch):
+                self.assertEqual(summary, expected)
+
+        # every site is certified for some records
+        for key in ["linkedin", "personal", "researchgate"]:
+            self.assertTrue(any(s[key + "Certified"] for s in objects))
+
+    def test_unknown_classifier(self):
+        """Test that the pandas engine refuses a classifier it does not implement"""
+
+        class OtherResult(parse.PersonInformationResult):
+            key = 'other'
+            hosts = ('example.org',)
+
+        registry = parse.ClassifierRegistry()
+        for cls in list(parse.CLASSIFIERS) + [OtherResult]:
+            registry.register(cls)
+
+        book, records = make_records(5)
+        with mock.patch.object(parse_batch, 'CLASSIFIERS', registry):
+            with self.assertRaises(NotImplementedError):
+                parse_batch.summarize(records, 'advanced', book)
+
+
+if __name__ == '__main__':
+    unittest.main()
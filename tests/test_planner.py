@@ -0,0 +1,86 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas
+
+import ingest
+import planner
+from store import ResultStore
+
+
+def make_book(n_persons):
+    rows = [{"Country": "X", "CompanyName": "Acme", "FirstName": "F{0}".format(i),
+             "LastName": "L{0}".format(i), "EmailAddress": "p{0}@x.com".format(i)} for i in range(n_persons)]
+    return ingest.AddressBook(pandas.DataFrame(rows))
+
+
+class PlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = ResultStore(os.path.join(self.dir, 'database.sqlite'))
+        self.book = make_book(3)
+        for email in self.book:
+            self.db[email] = None
+
+        # Google queries sent, answered without any result
+        self.queries = []
+
+        def do_google_query_pages(query, archive=None, pages=1, stop=None, limiter=None):
+            self.queries.append(query)
+            return [], 1
+
+        patcher = mock.patch.object(ingest, 'do_google_query_pages', do_google_query_pages)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def run_quietly(self, fcn, *args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            fcn(*args, **kwargs)
+
+    def test_populated_records(self):
+        """Test that the plan does not run again the query of populate_database"""
+
+        self.run_quietly(ingest.populate_database, self.db, query='name+surname+email', book=self.book)
+        self.assertEqual(self.queries, ['F0 L0 "p0@x.com"', 'F1 L1 "p1@x.com"', 'F2 L2 "p2@x.com"'])
+        self.assertEqual(self.db.plans()['p0@x.com'], (['name+surname+email'], False))
+
+        del self.queries[:]
+        self.run_quietly(planner.plan_database, self.db, tiers=['email', 'name+surname+email'], book=self.book)
+        self.assertEqual(self.queries, ['p0@x.com', 'p1@x.com', 'p2@x.com'])
+        self.assertEqual(self.db.plans()['p0@x.com'], (['name+surname+email', 'email'], False))
+
+        # Every template has been run
+        del self.queries[:]
+        self.run_quietly(planner.plan_database, self.db, tiers=['email', 'name+surname+email'], book=self.book)
+        self.assertEqual(self.queries, [])
+
+    def test_records_without_plan(self):
+        """Test that records filled before query plans were stored get the template given"""
+
+        for email in self.book:
+            self.db[email] = []
+
+        self.run_quietly(planner.plan_database, self.db, tiers=['email', 'name+surname+email'], book=self.book,
+                         query='name+surname+email')
+        self.assertEqual(self.queries, ['p0@x.com', 'p1@x.com', 'p2@x.com'])
+
+    def test_same_query_string(self):
+        """Test that a template giving the same query string as one already run is skipped"""
+
+        with mock.patch.dict(ingest.QUERY_TEMPLATES, {'email+email': '{email}'}):
+            self.run_quietly(planner.plan_database, self.db, tiers=['email', 'email+email'], book=self.book)
+        self.assertEqual(self.queries, ['p0@x.com', 'p1@x.com', 'p2@x.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()